@@ -1,49 +1,27 @@
 from pacman_module.game import Agent, Directions
-from pacman_module.util import PriorityQueue, manhattanDistance
+from pacman_module.heuristics import foodMSTDistance
+from pacman_module.pacman import PacmanSearchProblem
+from pacman_module.util import IndexedPriorityQueue, SearchNode
 
 
-def key(state):
-    """Returns a key that uniquely identifies a Pacman game state.
-
-    Arguments:
-        state: a game state. See API or class `pacman.GameState`.
-
-    Returns:
-        A hashable key tuple.
-    """
-
-    return (
-        state.getPacmanPosition(),
-        tuple(state.getCapsules()),
-        state.getFood(),
-    )
+def heuristic(problem, state):
+    """Computes the heuristic cost for a given search state.
 
-
-def heuristic(state):
-    """Computes the heuristic cost for a given game state.
-
-    The cost is calculated as the furthest distance between
-    PacMan and each of the remaining food dots.
+    The cost is calculated as the weight of the minimum spanning tree
+    of the remaining food dots, plus the maze distance between PacMan
+    and the closest one.
 
     Arguments:
-        state: a game state. See API or class `pacman.GameState`.
+        problem: a search problem. See class `pacman.PacmanSearchProblem`.
+        state: a search state of `problem`.
 
     Returns:
-        The maximum distance to a food dot.
+        A lower bound on the number of moves needed to eat all the food.
     """
 
-    pacman_pos = state.getPacmanPosition()
-
-    # Consider food dots
-    food_list = state.getFood().asList()
-    max_dist = 0
+    pacman_pos, food, _ = state
 
-    for food_dot in food_list:
-        dist = manhattanDistance(pacman_pos, food_dot)
-        if max_dist < dist:
-            max_dist = dist
-
-    return max_dist
+    return foodMSTDistance(pacman_pos, food, problem.layout)
 
 
 class PacmanAgent(Agent):
@@ -82,42 +60,41 @@ class PacmanAgent(Agent):
             A list of legal moves.
         """
 
-        path = []
-        fringe = PriorityQueue()
-        fringe.push((state, path, 0), heuristic(state))
+        # Dead-end pockets without food are never worth entering
+        problem = PacmanSearchProblem.forState(state, prunePockets=True)
+        start = problem.getStartState()
+        # The fringe holds a single node per search state
+        fringe = IndexedPriorityQueue(key=lambda node: node.state)
+        fringe.push(SearchNode(start), heuristic(problem, start))
         closed = set()
 
         while True:
             if fringe.isEmpty():
                 return []
 
-            _, (current, path, curr_g_cost) = fringe.pop()
-            cap_number = len(current.getCapsules())
-
-            if current.isWin():
-                return path
+            _, node = fringe.pop()
+            current = node.state
 
-            current_key = key(current)
+            if problem.isGoalState(current):
+                # Expanding the corridors followed into primitive moves
+                return [action for actions in node.getActions()
+                        for action in actions]
 
-            if current_key in closed:
-                continue
-            else:
-                closed.add(current_key)
+            closed.add(current)
 
-            for successor, action in current.generatePacmanSuccessors():
+            # Macro actions follow whole corridors, whose cells hold no food
+            for successor, actions, step_cost in \
+                    problem.getMacroSuccessors(current):
+                if successor in closed:
+                    continue
 
-                # Updating g_cost
-                if cap_number > len(successor.getCapsules()):
-                    # Time cost (+1) + Eaten capsule (+5)
-                    g_cost = curr_g_cost + 6
-                else:
-                    # Time cost (+1)
-                    g_cost = curr_g_cost + 1
+                # Updating g_cost: time cost (+1 per move), plus eaten
+                # capsule (+5)
+                child = node.child(successor, actions, step_cost)
 
                 # Evaluation function f(n) = g(n) + h(n)
-                f_cost = g_cost + heuristic(successor)
-
-                # Pushing into fringe a tuple (state, path, g_cost) and f_cost
-                fringe.push((successor, path + [action], g_cost), f_cost)
+                f_cost = child.cost + heuristic(problem, successor)
 
-        return path
+                # Inserting the child node, or decreasing the f_cost of the
+                # node already in the fringe for the same state
+                fringe.update(child, f_cost)
@@ -0,0 +1,220 @@
+import argparse
+import csv
+import importlib
+import json
+import os
+import random
+import sys
+import time
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from pacman_module import ghostAgents, layout, sampling
+from pacman_module.pacman import runGame
+
+
+FIELDS = ['agent', 'layout', 'seed', 'score', 'time', 'nodes', 'wall',
+          'error']
+
+
+def playGame(agent, layoutName, seed, ghost=None, p=0.5, expout=0.0):
+    """
+    Plays one headless game and returns its results as a dictionary.
+
+    Arguments:
+    ----------
+    - `agent`: name of the Python module containing a `PacmanAgent` class.
+    - `layoutName`: maze layout (from layouts folder).
+    - `seed`: seed of the `random` and `numpy.random` generators, and of
+      the batch draws of `pacman_module.sampling`.
+    - `ghost`: name of a ghost agent class of `pacman_module.ghostAgents`,
+      which controls every ghost of the layout, or None for no ghost.
+    - `p`: parameter of the ghost agents.
+    - `expout`: node expansion budget per move (0 for no limit).
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    sampling.setSeed(seed)
+
+    ghosts = []
+    if ghost is not None:
+        numGhosts = layout.getLayout(layoutName).getNumGhosts()
+        ghosts = [getattr(ghostAgents, ghost)(i + 1, Namespace(p=p))
+                  for i in range(numGhosts)]
+
+    start = time.perf_counter()
+    score, computationTime, nodes = runGame(
+        layout_name=layoutName,
+        pacman=importlib.import_module(agent).PacmanAgent(),
+        ghosts=ghosts,
+        beliefstateagent=None,
+        displayGraphics=False,
+        expout=expout,
+        hiddenGhosts=False,
+        quiet=True,
+    )
+
+    return {
+        'agent': agent,
+        'layout': layoutName,
+        'seed': seed,
+        'score': score,
+        'time': computationTime,
+        'nodes': nodes,
+        'wall': time.perf_counter() - start,
+        'error': '',
+    }
+
+
+def runBatch(agents, layouts, seeds, jobs=None, **kwargs):
+    """
+    Plays every (agent, layout, seed) game over a pool of `jobs` processes
+    and returns the list of their results, in that order. A game raising
+    an exception is reported in the `error` field of its result.
+    """
+    games = [(agent, layoutName, seed)
+             for agent in agents for layoutName in layouts for seed in seeds]
+    results = {}
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(playGame, *game, **kwargs): game
+                   for game in games}
+        for future in as_completed(futures):
+            game = futures[future]
+            try:
+                results[game] = future.result()
+            except Exception as e:
+                results[game] = dict(zip(FIELDS, game), score=None,
+                                     time=None, nodes=None, wall=None,
+                                     error=f'{type(e).__name__}: {e}')
+
+    return [results[game] for game in games]
+
+
+def writeResults(results, path):
+    """
+    Writes results to `path`, in JSON if its extension is `.json` and in
+    CSV otherwise.
+    """
+    with open(path, 'w', newline='') as f:
+        if path.endswith('.json'):
+            json.dump(results, f, indent=2)
+        else:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+
+
+def printSummary(results):
+    """
+    Prints the mean score, computation time and expanded nodes of each
+    (agent, layout) pair.
+    """
+    groups = {}
+    for result in results:
+        groups.setdefault((result['agent'], result['layout']), []).append(
+            result)
+
+    print(f"{'agent':<12} {'layout':<12} {'games':>5} {'errors':>6} "
+          f"{'score':>10} {'time':>10} {'nodes':>10}")
+    for (agent, layoutName), group in groups.items():
+        played = [r for r in group if not r['error']]
+        if played:
+            score, t, nodes = (np.mean([r[key] for r in played])
+                               for key in ('score', 'time', 'nodes'))
+        else:
+            score = t = nodes = float('nan')
+        print(f"{agent:<12} {layoutName:<12} {len(group):>5} "
+              f"{len(group) - len(played):>6} "
+              f"{score:>10.1f} {t:>10.4f} {nodes:>10.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Play headless games for every combination of agents, '
+                    'layouts and seeds, in parallel.')
+
+    parser.add_argument(
+        '-a',
+        '--agents',
+        nargs='+',
+        required=True,
+        help='Python modules containing a `PacmanAgent` class.',
+    )
+
+    parser.add_argument(
+        '-l',
+        '--layouts',
+        nargs='+',
+        default=['small', 'medium', 'large'],
+        help='Maze layouts (from layouts folder).',
+    )
+
+    parser.add_argument(
+        '-s',
+        '--seeds',
+        nargs='+',
+        type=int,
+        default=[0],
+        help='Seeds of the random number generators, one game per seed.',
+    )
+
+    parser.add_argument(
+        '-g',
+        '--ghost',
+        default=None,
+        help='Ghost agent class (from ghostAgents) controlling every ghost '
+             'of the layouts. No ghost by default.',
+    )
+
+    parser.add_argument(
+        '-p',
+        type=float,
+        default=0.5,
+        help='Parameter of the ghost agents.',
+    )
+
+    parser.add_argument(
+        '-e',
+        '--expout',
+        type=float,
+        default=0.0,
+        help='Node expansion budget per move (0 for no limit).',
+    )
+
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=os.cpu_count(),
+        help='Number of worker processes.',
+    )
+
+    parser.add_argument(
+        '-o',
+        '--output',
+        default=None,
+        help='File to write the results to, in JSON if it ends with .json '
+             'and in CSV otherwise.',
+    )
+
+    args = parser.parse_args()
+
+    if 'humanagent' in args.agents:
+        raise ValueError("Human agent cannot play without graphics")
+
+    results = runBatch(args.agents, args.layouts, args.seeds,
+                       jobs=args.jobs, ghost=args.ghost, p=args.p,
+                       expout=args.expout)
+
+    printSummary(results)
+    if args.output is not None:
+        writeResults(results, args.output)
+
+    for result in results:
+        if result['error']:
+            print(f"{result['agent']} on {result['layout']} "
+                  f"(seed {result['seed']}): {result['error']}",
+                  file=sys.stderr)
@@ -0,0 +1,277 @@
+"""
+Benchmarks of the search agents, with regression tracking.
+
+Each (agent, layout) case is played without graphics in a fresh Python
+process, so that its peak memory usage is measured on its own, and the
+following metrics are recorded:
+
+- `wall`: wall time of the game (s), including the game engine;
+- `time`: computation time of the agent (s), as reported by the game;
+- `nodes`: number of expanded nodes;
+- `nodesPerSec`: expanded nodes per second of computation time;
+- `rss`: peak resident set size of the process (MiB);
+- `score`: final score of the game;
+- `moves`: number of moves of the solution played by Pacman.
+
+Results are compared with those stored in `baseline.json`: a case regresses
+if one of its metrics is worse than the baseline by more than the relative
+tolerance of the metric. Timings depend on the machine, so the baseline
+should be updated (with `--update`) on the machine running the benchmarks,
+and timings are only compared for cases lasting long enough.
+
+Usage:
+
+    python benchmarks/run.py [--agents ...] [--layouts ...] [--update]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baseline.json')
+
+AGENTS = ['bfs', 'dfs', 'astar', 'idastar', 'martin', 'gilles', 'test']
+# Layouts of the layouts folder, then generated ones (see
+# pacman_module/layoutGenerator.py)
+LAYOUTS = ['small', 'medium', 'large', 'maze-41x41-seed=0-food=6',
+           'rooms-61x41-seed=0-food=6', 'open-61x61-seed=0-food=5']
+
+# Metrics for which a larger value is better, the others being costs
+HIGHER_IS_BETTER = {'nodesPerSec', 'score'}
+
+# Default relative tolerances: timings are noisy, search results are not
+TOLERANCES = {
+    'wall': 0.5,
+    'time': 0.5,
+    'nodes': 0.0,
+    'nodesPerSec': 0.5,
+    'rss': 0.25,
+    'score': 0.0,
+    'moves': 0.0,
+}
+
+# Timings of cases whose baseline computation time is shorter than this
+# (in seconds) are too noisy to be compared
+MIN_TIME = 0.1
+TIMINGS = {'wall', 'time', 'nodesPerSec'}
+
+
+def runCase(agent, layoutName):
+    """
+    Plays the game of `agent` on `layoutName` in this process and returns
+    its metrics.
+    """
+    import importlib
+    from pacman_module import layout, textDisplay
+    from pacman_module.pacman import ClassicGameRules
+
+    lay = layout.getLayout(layoutName)
+    if lay is None:
+        raise ValueError(f"Unknown layout {layoutName}")
+    pacman = importlib.import_module(agent).PacmanAgent()
+    rules = ClassicGameRules(0.0)
+    game = rules.newGame(lay, pacman, [], None, textDisplay.NullGraphics(),
+                         quiet=True)
+
+    start = time.perf_counter()
+    score, computationTime, nodes = game.run()
+    wall = time.perf_counter() - start
+
+    return {
+        'wall': wall,
+        'time': computationTime,
+        'nodes': nodes,
+        'nodesPerSec': nodes / computationTime if computationTime > 0 else 0.,
+        # ru_maxrss is in KiB on Linux
+        'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.,
+        'score': score,
+        'moves': sum(1 for index, _ in game.moveHistory if index == 0),
+    }
+
+
+def measure(agent, layoutName, repeat=1):
+    """
+    Runs a case `repeat` times, each in a fresh process, and returns its
+    metrics. Timings are the best over all runs.
+    """
+    runs = []
+    for _ in range(repeat):
+        process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__),
+             '--case', agent, layoutName],
+            cwd=ROOT, capture_output=True, text=True)
+        if process.returncode != 0:
+            raise RuntimeError(
+                f"{agent}/{layoutName} failed:\n{process.stderr}")
+        runs.append(json.loads(process.stdout.splitlines()[-1]))
+
+    metrics = dict(runs[0])
+    for metric in ('wall', 'time', 'rss'):
+        metrics[metric] = min(run[metric] for run in runs)
+    metrics['nodesPerSec'] = max(run['nodesPerSec'] for run in runs)
+    return metrics
+
+
+def compare(results, baseline, tolerances):
+    """
+    Returns the list of regressions of `results` with respect to
+    `baseline`, as (case, metric, value, baseline value) tuples.
+    """
+    regressions = []
+    for case, metrics in results.items():
+        reference = baseline.get(case)
+        if reference is None:
+            continue
+        timed = reference.get('time', 0.) >= MIN_TIME
+        for metric, value in metrics.items():
+            if metric not in reference or metric not in tolerances:
+                continue
+            if metric in TIMINGS and not timed:
+                continue
+            bound = reference[metric]
+            if metric in HIGHER_IS_BETTER:
+                worse = value < bound - abs(bound) * tolerances[metric]
+            else:
+                worse = value > bound + abs(bound) * tolerances[metric]
+            if worse:
+                regressions.append((case, metric, value, bound))
+    return regressions
+
+
+def loadBaseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'tolerances': {}, 'cases': {}}
+
+
+def parseTolerance(text):
+    metric, _, value = text.partition('=')
+    if metric not in TOLERANCES:
+        raise argparse.ArgumentTypeError(f"Unknown metric {metric}")
+    return metric, float(value)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the search agents and compare the results '
+                    'with a baseline.')
+
+    parser.add_argument(
+        '-a',
+        '--agents',
+        nargs='+',
+        default=AGENTS,
+        help='Python modules containing a `PacmanAgent` class.',
+    )
+
+    parser.add_argument(
+        '-l',
+        '--layouts',
+        nargs='+',
+        default=LAYOUTS,
+        help='Maze layouts (from layouts folder).',
+    )
+
+    parser.add_argument(
+        '-r',
+        '--repeat',
+        type=int,
+        default=3,
+        help='Number of runs of each case, timings being the best ones.',
+    )
+
+    parser.add_argument(
+        '-b',
+        '--baseline',
+        default=BASELINE,
+        help='Baseline JSON file.',
+    )
+
+    parser.add_argument(
+        '-t',
+        '--tolerance',
+        nargs='+',
+        type=parseTolerance,
+        default=[],
+        metavar='METRIC=VALUE',
+        help='Relative tolerances overriding those of the baseline, '
+             'e.g. wall=0.2.',
+    )
+
+    parser.add_argument(
+        '-u',
+        '--update',
+        default=False,
+        action='store_true',
+        help='Store the results as the new baseline of their cases.',
+    )
+
+    parser.add_argument(
+        '-o',
+        '--output',
+        default=None,
+        help='JSON file to write the results to.',
+    )
+
+    parser.add_argument(
+        '--case',
+        nargs=2,
+        metavar=('AGENT', 'LAYOUT'),
+        help=argparse.SUPPRESS,
+    )
+
+    args = parser.parse_args()
+
+    if args.case is not None:
+        # Child process measuring a single case
+        print(json.dumps(runCase(*args.case)))
+        sys.exit(0)
+
+    baseline = loadBaseline(args.baseline)
+    tolerances = dict(TOLERANCES, **baseline.get('tolerances', {}))
+    tolerances.update(args.tolerance)
+
+    results = {}
+    print(f"{'case':<36} {'wall':>8} {'time':>8} {'nodes':>8} "
+          f"{'nodes/s':>10} {'rss':>8} {'score':>7} {'moves':>6}")
+    for agent in args.agents:
+        for layoutName in args.layouts:
+            case = f'{agent}/{layoutName}'
+            m = results[case] = measure(agent, layoutName, args.repeat)
+            print(f"{case:<36} {m['wall']:>8.3f} {m['time']:>8.3f} "
+                  f"{m['nodes']:>8} {m['nodesPerSec']:>10.0f} "
+                  f"{m['rss']:>8.1f} {m['score']:>7.0f} {m['moves']:>6}")
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.update:
+        baseline['cases'].update(results)
+        baseline['tolerances'] = {
+            metric: tolerance for metric, tolerance in tolerances.items()
+            if tolerance != TOLERANCES[metric]}
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline {args.baseline} updated.")
+        sys.exit(0)
+
+    regressions = compare(results, baseline['cases'], tolerances)
+    for case, metric, value, bound in regressions:
+        print(f"Regression: {case} {metric} = {value:.6g} "
+              f"(baseline {bound:.6g}, tolerance {tolerances[metric]:.0%})")
+    missing = [case for case in results if case not in baseline['cases']]
+    if missing:
+        print(f"No baseline for {', '.join(missing)}.")
+    sys.exit(1 if regressions else 0)
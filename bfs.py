@@ -1,23 +1,6 @@
-from pacman_module.util import Queue
+from pacman_module.util import Queue, SearchNode
 from pacman_module.game import Agent, Directions
-
-
-def key(state):
-    """Returns a key that uniquely identifies a Pacman game state.
-
-    Arguments:
-        state: a game state. See API or class `pacman.GameState`.
-
-    Returns:
-        A hashable key tuple.
-    """
-
-    return (
-        state.getPacmanPosition(),
-        tuple(state.getGhostPositions()),
-        tuple(state.getCapsules()),
-        state.getFood(),
-    )
+from pacman_module.pacman import PacmanSearchProblem
 
 
 class PacmanAgent(Agent):
@@ -57,26 +40,29 @@ class PacmanAgent(Agent):
             A list of legal moves.
         """
 
-        path = []
+        # Dead-end pockets without food are never worth entering
+        problem = PacmanSearchProblem.forState(state, prunePockets=True)
         fringe = Queue()
-        fringe.push((state, path))
+        fringe.push(SearchNode(problem.getStartState()))
         closed = set()
 
         while True:
             if fringe.isEmpty():
                 return []
 
-            current, path = fringe.pop()
-
-            if current.isWin():
-                return path
+            node = fringe.pop()
+            current = node.state
 
-            current_key = key(current)
+            if problem.isGoalState(current):
+                return node.getActions()
 
-            if current_key in closed:
+            # Search states are compact hashable tuples, no key needed
+            if current in closed:
                 continue
             else:
-                closed.add(current_key)
+                closed.add(current)
 
-            for successor, action in current.generatePacmanSuccessors():
-                fringe.push((successor, path + [action]))
+            fringe.extend(
+                node.child(successor, action)
+                for successor, action, _ in problem.getSuccessors(current)
+            )
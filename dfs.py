@@ -1,24 +1,6 @@
 from pacman_module.game import Agent, Directions
-from pacman_module.util import Stack
-
-
-def key(state):
-    """Returns a key that uniquely identifies a Pacman game state.
-
-    Arguments:
-        state: a game state. See API or class `pacman.GameState`.
-
-    Returns:
-        A hashable key tuple.
-    """
-
-    return (
-        state.getPacmanPosition(),
-        tuple(state.getGhostPositions()),
-        tuple(state.getCapsules()),
-        state.getFood(),
-        # state.getPacmanState().getDirection()
-    )
+from pacman_module.pacman import PacmanSearchProblem
+from pacman_module.util import SearchNode, Stack
 
 
 class PacmanAgent(Agent):
@@ -58,28 +40,26 @@ class PacmanAgent(Agent):
             A list of legal moves.
         """
 
-        path = []
+        problem = PacmanSearchProblem.forState(state)
         fringe = Stack()
-        fringe.push((state, path))
+        fringe.push(SearchNode(problem.getStartState()))
         closed = set()
 
         while True:
             if fringe.isEmpty():
                 return []
 
-            current, path = fringe.pop()
-
-            if current.isWin():
-                return path
+            node = fringe.pop()
+            current = node.state
 
-            current_key = key(current)
+            if problem.isGoalState(current):
+                return node.getActions()
 
-            if current_key in closed:
+            # Search states are compact hashable tuples, no key needed
+            if current in closed:
                 continue
             else:
-                closed.add(current_key)
-
-            for successor, action in current.generatePacmanSuccessors():
-                fringe.push((successor, path + [action]))
+                closed.add(current)
 
-        return path
+            for successor, action, _ in problem.getSuccessors(current):
+                fringe.push(node.child(successor, action))
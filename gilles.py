@@ -1,5 +1,5 @@
 from pacman_module.game import Agent, Directions
-from pacman_module.util import PriorityQueue, manhattanDistance
+from pacman_module.util import IndexedPriorityQueue, SearchNode
 
 
 def key(state):
@@ -42,18 +42,18 @@ def heuristic(state):
     closestFoodDist = float('inf')
 
     if foodList:
-        # Find distance to closest food dot based on the Manhattan Distance
+        # Find distance to closest food dot based on the maze distance
         closestFoodDist = min(
-            [manhattanDistance(pos, food) for food in foodList]
+            [state.getMazeDistance(pos, food) for food in foodList]
             )
         score += 10 * len(foodList)
 
     # Consider capsules
     capsuleList = state.getCapsules()
     if capsuleList:
-        # Find distance to closest capsule based on the Manhattan Distance
+        # Find distance to closest capsule based on the maze distance
         closestCapsuleDist = min(
-            [manhattanDistance(pos, capsule) for capsule in capsuleList]
+            [state.getMazeDistance(pos, capsule) for capsule in capsuleList]
         )
         # Check if a capsule is on the shortest path to the nearest food dot
         if closestCapsuleDist <= closestFoodDist:
@@ -88,35 +88,32 @@ class PacmanAgent(Agent):
             A list of legal moves.
         """
 
-        path = []
-        fringe = PriorityQueue()
-        fringe.push((state, path), heuristic(state))
+        # The fringe holds a single node per state key
+        fringe = IndexedPriorityQueue(key=lambda node: key(node.state))
+        fringe.push(SearchNode(state), heuristic(state))
         closed = set()
 
         while True:
             if fringe.isEmpty():
                 return []
 
-            priority, item = fringe.pop()
-            current, path = item
+            priority, node = fringe.pop()
+            current = node.state
 
             if current.isWin():
-                return path
+                return node.getActions()
 
-            current_key = key(current)
-
-            if current_key in closed:
-                continue
-            else:
-                closed.add(current_key)
+            closed.add(key(current))
 
             for successor, action in current.generatePacmanSuccessors():
-                g_cost = len(path) + 1
+                if key(successor) in closed:
+                    continue
 
-                # Evaluation function f(n) = g(n) + h(n)
-                f_cost = g_cost + heuristic(successor)
+                child = node.child(successor, action)
 
-                # Pushing into priority queue a tuple (state, path) and f_cost
-                fringe.push((successor, path + [action]), f_cost)
+                # Evaluation function f(n) = g(n) + h(n)
+                f_cost = child.depth + heuristic(successor)
 
-        return path
+                # Inserting the child node, or decreasing the f_cost of the
+                # node already in the priority queue for the same state
+                fringe.update(child, f_cost)
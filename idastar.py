@@ -0,0 +1,167 @@
+from collections import OrderedDict
+
+from pacman_module.game import Agent, Directions
+from pacman_module.heuristics import foodMSTDistance
+from pacman_module.pacman import PacmanSearchProblem
+
+# Maximum number of search states stored in the transposition table
+TABLE_SIZE = 100000
+
+
+def heuristic(problem, state):
+    """Computes the heuristic cost for a given search state.
+
+    The cost is calculated as the weight of the minimum spanning tree
+    of the remaining food dots, plus the maze distance between PacMan
+    and the closest one.
+
+    Arguments:
+        problem: a search problem. See class `pacman.PacmanSearchProblem`.
+        state: a search state of `problem`.
+
+    Returns:
+        A lower bound on the number of moves needed to eat all the food.
+    """
+
+    pacman_pos, food, _ = state
+
+    return foodMSTDistance(pacman_pos, food, problem.layout)
+
+
+class TranspositionTable:
+    """Bounded map from search states to the lowest path cost with which
+    they were reached, evicting the least recently used states first."""
+
+    def __init__(self, size=TABLE_SIZE):
+        self.size = size
+        self.costs = OrderedDict()
+
+    def get(self, state):
+        """Returns the lowest known cost of `state`, or None."""
+
+        cost = self.costs.get(state)
+        if cost is not None:
+            self.costs.move_to_end(state)
+        return cost
+
+    def put(self, state, cost):
+        self.costs[state] = cost
+        self.costs.move_to_end(state)
+        if len(self.costs) > self.size:
+            self.costs.popitem(last=False)
+
+
+class PacmanAgent(Agent):
+    """Pacman agent based on iterative deepening A star search (IDA*)."""
+
+    def __init__(self):
+        super().__init__()
+        self.moves = None
+
+    def get_action(self, state):
+        """Given a Pacman game state, returns a legal move.
+
+        Arguments:
+            state: a game state. See API or class `pacman.GameState`.
+
+        Return:
+            A legal move as defined in `game.Directions`.
+        """
+
+        if self.moves is None:
+            self.moves = self.idastar(state)
+
+        if self.moves:
+            return self.moves.pop(0)
+        else:
+            return Directions.STOP
+
+    def idastar(self, state):
+        """Given a Pacman game state, returns a list of legal moves to solve
+        the search layout.
+
+        Depth-first searches are run with an increasing bound on the
+        evaluation function f(n) = g(n) + h(n), each new bound being the
+        smallest f_cost exceeding the previous one. Only the current path
+        and a bounded transposition table are kept in memory.
+
+        Arguments:
+            state: a game state. See API or class `pacman.GameState`.
+
+        Returns:
+            A list of legal moves.
+        """
+
+        problem = PacmanSearchProblem.forState(state)
+        start = problem.getStartState()
+        bound = heuristic(problem, start)
+
+        while True:
+            moves, bound = self.search(problem, start, bound)
+            if moves is not None:
+                return moves
+            if bound is None:
+                return []
+
+    def search(self, problem, start, bound):
+        """Runs a depth-first search bounded by `bound` on f_cost.
+
+        Arguments:
+            problem: a search problem. See class `pacman.PacmanSearchProblem`.
+            start: the search state to start from.
+            bound: the largest f_cost of the nodes to expand.
+
+        Returns:
+            The list of moves to a goal state, or None if none is within the
+            bound, and the smallest f_cost exceeding the bound, or None if
+            the search space is exhausted.
+        """
+
+        table = TranspositionTable()
+        table.put(start, 0)
+        next_bound = None
+
+        # The fringe holds (search state, g_cost, depth, action) tuples,
+        # and path the actions leading to the last expanded node
+        fringe = [(start, 0, 0, None)]
+        path = []
+
+        while fringe:
+            current, g_cost, depth, action = fringe.pop()
+
+            # Skipping nodes reached again with a lower cost since pushed
+            known = table.get(current)
+            if known is not None and known < g_cost:
+                continue
+
+            del path[max(depth - 1, 0):]
+            if action is not None:
+                path.append(action)
+
+            if problem.isGoalState(current):
+                return list(path), bound
+
+            children = []
+            for successor, action, step_cost in problem.getSuccessors(current):
+                cost = g_cost + step_cost
+                f_cost = cost + heuristic(problem, successor)
+
+                if f_cost > bound:
+                    if next_bound is None or f_cost < next_bound:
+                        next_bound = f_cost
+                    continue
+
+                known = table.get(successor)
+                if known is not None and known <= cost:
+                    continue
+                table.put(successor, cost)
+
+                children.append((f_cost, successor, action, cost))
+
+            # Move ordering: children with the lowest f_cost are expanded
+            # first, hence pushed last
+            children.sort(key=lambda child: child[0], reverse=True)
+            for _, successor, action, cost in children:
+                fringe.append((successor, cost, depth + 1, action))
+
+        return None, next_bound
@@ -1,5 +1,6 @@
 from pacman_module.game import Agent, Directions
-from pacman_module.util import PriorityQueue, manhattanDistance
+from pacman_module.heuristics import foodMSTDistance
+from pacman_module.util import IndexedPriorityQueue, SearchNode
 
 
 def key(state):
@@ -22,28 +23,22 @@ def key(state):
 def heuristic(state):
     """Computes the heuristic cost for a given game state.
 
-    The cost is calculated as the furthest distance between
-    PacMan and each of the remaining food dots.
+    The cost is calculated as the weight of the minimum spanning tree
+    of the remaining food dots, plus the maze distance between PacMan
+    and the closest one.
 
     Arguments:
         state: a game state. See API or class `pacman.GameState`.
 
     Returns:
-        The maximum distance to a food dot.
+        A lower bound on the number of moves needed to eat all the food.
     """
 
-    pacman_pos = state.getPacmanPosition()
-
-    # Consider food dots
-    food_list = state.getFood().asList()
-    max_dist = 0
-
-    for food_dot in food_list:
-        dist = manhattanDistance(pacman_pos, food_dot)
-        if max_dist < dist:
-            max_dist = dist
-
-    return max_dist
+    return foodMSTDistance(
+        state.getPacmanPosition(),
+        state.getFood(),
+        state.getLayout(),
+    )
 
 
 class PacmanAgent(Agent):
@@ -81,42 +76,39 @@ class PacmanAgent(Agent):
             A list of legal moves.
         """
 
-        path = []
-        fringe = PriorityQueue()
-        fringe.push((state, path, 0), heuristic(state))
+        # The fringe holds a single node per state key
+        fringe = IndexedPriorityQueue(key=lambda node: key(node.state))
+        fringe.push(SearchNode(state), heuristic(state))
         closed = set()
 
         while True:
             if fringe.isEmpty():
                 return []
 
-            _, (current, path, curr_g_cost) = fringe.pop()
+            _, node = fringe.pop()
+            current = node.state
             cap_number = len(current.getCapsules())
 
             if current.isWin():
-                return path
+                return node.getActions()
 
-            current_key = key(current)
-
-            if current_key in closed:
-                continue
-            else:
-                closed.add(current_key)
+            closed.add(key(current))
 
             for successor, action in current.generatePacmanSuccessors():
+                if key(successor) in closed:
+                    continue
 
                 # Updating g_cost
                 if cap_number > len(successor.getCapsules()):
                     # Time cost (+1) + Eaten capsule (+5)
-                    g_cost = curr_g_cost + 6
+                    child = node.child(successor, action, 6)
                 else:
                     # Time cost (+1)
-                    g_cost = curr_g_cost + 1
+                    child = node.child(successor, action, 1)
 
                 # Evaluation function f(n) = g(n) + h(n)
-                f_cost = g_cost + heuristic(successor)
-
-                # Pushing into fringe a tuple (state, path, g_cost) and f_cost
-                fringe.push((successor, path + [action], g_cost), f_cost)
+                f_cost = child.cost + heuristic(successor)
 
-        return path
+                # Inserting the child node, or decreasing the f_cost of the
+                # node already in the fringe for the same state
+                fringe.update(child, f_cost)
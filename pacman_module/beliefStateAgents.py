@@ -0,0 +1,319 @@
+# beliefStateAgents.py
+# --------------------
+# Belief state agents tracking hidden ghosts from the noisy distances
+# returned by GameState.getNoisyGhostDistances.
+
+
+"""
+A belief state agent is the last agent of a game with hidden ghosts (see
+ClassicGameRules.newGame). Each turn, its get_action method receives the
+game state and returns the new belief states: one (width, height) array
+per ghost, giving the probability of each cell to hold the ghost, as
+displayed by graphicsDisplay.updateDistributions.
+"""
+
+import numpy as np
+from math import lgamma
+
+from .game import Agent, Actions, Directions
+from .pacman import GhostRules
+
+
+def uniformPolicy(legalActions):
+    """
+    Returns the probabilities of a ghost choosing each of 'legalActions'
+    uniformly, as an array.
+    """
+    return np.full(len(legalActions), 1.0 / len(legalActions))
+
+
+def eastRandyPolicy(p):
+    """
+    Returns the policy of ghostAgents.EastRandyGhost with parameter 'p':
+    EAST is chosen with probability p, and otherwise the ghost picks
+    uniformly among its legal actions, EAST included.
+    """
+    def policy(legalActions):
+        probabilities = uniformPolicy(legalActions)
+        if Directions.EAST in legalActions:
+            probabilities *= 1 - p
+            probabilities[legalActions.index(Directions.EAST)] += p
+        return probabilities
+    return policy
+
+
+def transitionModel(state, policy=uniformPolicy):
+    """
+    Returns the ghost transition model of the layout of 'state' as three
+    arrays (sources, destinations, probabilities): a ghost on the cell of
+    index sources[i] moves to the cell of index destinations[i] with
+    probability probabilities[i]. Cell (x, y) has index x * height + y, and
+    transitions are sorted by source.
+
+    Legal moves are those of GhostRules.getLegalActionsAtPositionAndDirection
+    and 'policy' gives the probability of each of them.
+    """
+    layout = state.data.layout
+    height = layout.height
+    sources, destinations, probabilities = [], [], []
+    for position in layout.walls.asList(False):
+        # Ghosts tracked by a belief state agent may turn around, so their
+        # direction does not matter
+        actions = GhostRules.getLegalActionsAtPositionAndDirection(
+            state, 1, position, Directions.STOP)
+        if not actions:
+            continue
+        source = position[0] * height + position[1]
+        for action, probability in zip(actions, policy(actions)):
+            x, y = Actions.getSuccessor(position, action)
+            sources.append(source)
+            destinations.append(x * height + y)
+            probabilities.append(probability)
+    return (np.array(sources, dtype=np.intp),
+            np.array(destinations, dtype=np.intp),
+            np.array(probabilities))
+
+
+def poissonLikelihood(rates, distances):
+    """
+    Returns the probabilities of observing the noisy 'distances', one per
+    ghost, given the true distances 'rates', an array of shape
+    (numGhosts, n) or (n,).
+    """
+    rates = np.asarray(rates, dtype=float)
+    distances = np.asarray(distances, dtype=float)[:, None]
+    logFactorials = np.array(
+        [lgamma(d + 1) for d in distances.ravel()])[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Poisson log-probabilities, with 0 * log(0) = 0
+        logLikelihood = np.where(
+            distances > 0, distances * np.log(rates), 0.) \
+            - rates - logFactorials
+    return np.exp(logLikelihood)
+
+
+class BayesFilter:
+    """
+    An exact Bayes filter over the cells of a layout, updating the beliefs
+    of all the ghosts at once.
+
+    Beliefs are handled as a (numGhosts, width * height) array, cell (x, y)
+    being column x * height + y, i.e. the row-major order of the
+    (width, height) arrays of the game.
+
+    The predict step applies the sparse transition model of
+    transitionModel with a single np.bincount for all the ghosts. The
+    observe step multiplies the beliefs by the Poisson likelihood of the
+    noisy distances, computed over the whole grid at once.
+    """
+
+    def __init__(self, state, policy=uniformPolicy):
+        layout = state.data.layout
+        self.width = layout.width
+        self.height = layout.height
+        self.size = self.width * self.height
+        self.sources, self.destinations, self.probabilities = \
+            transitionModel(state, policy)
+        self.xs, self.ys = np.divmod(np.arange(self.size), self.height)
+
+    def predict(self, beliefs):
+        """
+        Returns the beliefs after every ghost took one move.
+        """
+        numGhosts = len(beliefs)
+        offsets = (np.arange(numGhosts) * self.size)[:, None]
+        weights = beliefs[:, self.sources] * self.probabilities
+        predicted = np.bincount(
+            (self.destinations + offsets).ravel(), weights=weights.ravel(),
+            minlength=numGhosts * self.size)
+        return predicted.reshape(numGhosts, self.size)
+
+    def likelihood(self, pacmanPosition, distances):
+        """
+        Returns the (numGhosts, width * height) array of the probabilities
+        of observing the noisy 'distances' if each ghost was on each cell.
+        """
+        rates = np.abs(self.xs - pacmanPosition[0]) + \
+            np.abs(self.ys - pacmanPosition[1])
+        return poissonLikelihood(rates, distances)
+
+    def observe(self, beliefs, pacmanPosition, distances):
+        """
+        Returns the beliefs conditioned on the noisy 'distances' between
+        Pacman and each ghost. A ghost whose observation is impossible
+        under its belief keeps its belief.
+        """
+        posterior = beliefs * self.likelihood(pacmanPosition, distances)
+        totals = posterior.sum(axis=1, keepdims=True)
+        impossible = totals[:, 0] <= 0
+        posterior[impossible] = beliefs[impossible]
+        totals[impossible] = beliefs[impossible].sum(axis=1, keepdims=True)
+        return posterior / totals
+
+    def update(self, beliefs, pacmanPosition, distances):
+        """
+        Returns the beliefs after a predict step then an observe step.
+        """
+        return self.observe(self.predict(beliefs), pacmanPosition, distances)
+
+
+class BayesFilterAgent(Agent):
+    """
+    A belief state agent running an exact Bayes filter, assuming that the
+    ghosts behave as ghostAgents.EastRandyGhost with parameter 'p', or move
+    uniformly at random if 'p' is None.
+    """
+
+    def __init__(self, p=None):
+        Agent.__init__(self)
+        self.policy = uniformPolicy if p is None else eastRandyPolicy(p)
+        self.filter = None
+
+    def get_action(self, state):
+        if self.filter is None:
+            self.filter = BayesFilter(state, self.policy)
+        beliefs = np.asarray(state.getGhostBeliefStates(), dtype=float)
+        numGhosts, width, height = beliefs.shape
+        beliefs = self.filter.update(
+            beliefs.reshape(numGhosts, width * height),
+            state.getPacmanPosition(), state.getNoisyGhostDistances())
+        # Read-only beliefs are shared by the game states without copies
+        beliefs.flags.writeable = False
+        return list(beliefs.reshape(numGhosts, width, height))
+
+
+class ParticleFilter:
+    """
+    A particle filter tracking all the ghosts at once, for layouts too large
+    for exact beliefs.
+
+    Particles are the cell indices (x * height + y) of a (numGhosts,
+    numParticles) array. The predict step samples the next cell of every
+    particle from the transition model with one np.searchsorted, and the
+    observe step weights the particles by the Poisson likelihood of the
+    noisy distances then draws them again by systematic resampling. A ghost
+    whose particles all get a zero weight is spread again uniformly.
+    """
+
+    def __init__(self, state, numParticles=1000, policy=uniformPolicy,
+                 seed=None):
+        layout = state.data.layout
+        self.width = layout.width
+        self.height = layout.height
+        self.size = self.width * self.height
+        self.numParticles = numParticles
+        self.random = np.random.default_rng(seed)
+
+        sources, self.destinations, probabilities = \
+            transitionModel(state, policy)
+        self.cells = np.unique(sources)
+        # Transitions are sorted by source: adding the cumulative
+        # probability of each transition within its source to the source
+        # index gives increasing keys, and the transition taken from cell c
+        # with a uniform draw u is the first key larger than c + u
+        starts = np.searchsorted(sources, sources)
+        cumulative = np.cumsum(probabilities)
+        within = cumulative - (cumulative[starts] - probabilities[starts])
+        last = np.append(sources[1:] != sources[:-1], True)
+        within[last] = 1.
+        self.keys = sources + within
+        self.particles = None
+
+    def initialize(self, beliefs):
+        """
+        Draws the particles from 'beliefs', restricted to the open cells.
+        """
+        self.particles = np.empty((len(beliefs), self.numParticles),
+                                  dtype=np.intp)
+        for ghost, belief in enumerate(beliefs):
+            weights = belief[self.cells]
+            if weights.sum() <= 0:
+                weights = np.ones(len(self.cells))
+            self.particles[ghost] = self.random.choice(
+                self.cells, self.numParticles, p=weights / weights.sum())
+
+    def predict(self):
+        """
+        Moves every particle to a successor cell drawn from the transition
+        model.
+        """
+        draws = self.random.random(self.particles.shape)
+        transitions = np.searchsorted(
+            self.keys, self.particles + draws, side='right')
+        self.particles = self.destinations[transitions]
+
+    def observe(self, pacmanPosition, distances):
+        """
+        Weights the particles by the likelihood of the noisy 'distances'
+        between Pacman and each ghost, then resamples them.
+        """
+        xs, ys = np.divmod(self.particles, self.height)
+        rates = np.abs(xs - pacmanPosition[0]) + \
+            np.abs(ys - pacmanPosition[1])
+        weights = poissonLikelihood(rates, distances)
+        totals = weights.sum(axis=1)
+        depleted = totals <= 0
+        if depleted.any():
+            self.particles[depleted] = self.random.choice(
+                self.cells, (depleted.sum(), self.numParticles))
+            weights[depleted] = 1.
+            totals[depleted] = self.numParticles
+        self.resample(weights / totals[:, None])
+
+    def resample(self, weights):
+        """
+        Systematic resampling of the particles of every ghost, with one
+        uniform draw per ghost.
+        """
+        numGhosts, n = weights.shape
+        offsets = np.arange(numGhosts)[:, None]
+        cumulative = np.cumsum(weights, axis=1)
+        cumulative[:, -1] = 1.
+        positions = (np.arange(n) + self.random.random((numGhosts, 1))) / n
+        indices = np.searchsorted((cumulative + offsets).ravel(),
+                                  (positions + offsets).ravel(),
+                                  side='right')
+        indices = np.minimum(indices, numGhosts * n - 1)
+        self.particles = self.particles.ravel()[indices].reshape(
+            numGhosts, n)
+
+    def update(self, beliefs, pacmanPosition, distances):
+        """
+        Returns the particle densities, as a (numGhosts, width * height)
+        array, after a predict step then an observe step.
+        """
+        if self.particles is None:
+            self.initialize(beliefs)
+        self.predict()
+        self.observe(pacmanPosition, distances)
+        return self.densities()
+
+    def densities(self):
+        """
+        Returns the fraction of the particles of each ghost on each cell, as
+        a (numGhosts, width * height) array.
+        """
+        numGhosts = len(self.particles)
+        offsets = (np.arange(numGhosts) * self.size)[:, None]
+        counts = np.bincount((self.particles + offsets).ravel(),
+                             minlength=numGhosts * self.size)
+        return counts.reshape(numGhosts, self.size) / self.numParticles
+
+
+class ParticleFilterAgent(BayesFilterAgent):
+    """
+    A belief state agent running a particle filter with 'numParticles'
+    particles per ghost, with the same ghost model as BayesFilterAgent.
+    Beliefs are the densities of the particles.
+    """
+
+    def __init__(self, p=None, numParticles=1000, seed=None):
+        BayesFilterAgent.__init__(self, p)
+        self.numParticles = numParticles
+        self.seed = seed
+
+    def get_action(self, state):
+        if self.filter is None:
+            self.filter = ParticleFilter(state, self.numParticles,
+                                         self.policy, self.seed)
+        return BayesFilterAgent.get_action(self, state)
@@ -23,6 +23,7 @@
 from .util import *
 import time
 import os
+import random
 import traceback
 import sys
 import pacman_module as pacmodule
@@ -84,6 +85,23 @@ class Directions:
                STOP: STOP}
 
 
+class DirectionCounter(DenseCounter):
+    """
+    A DenseCounter keyed by the directions, e.g. a distribution over the
+    actions of an agent.
+    """
+
+    KEYS = (Directions.NORTH, Directions.SOUTH, Directions.EAST,
+            Directions.WEST, Directions.STOP)
+    INDEX = {key: i for i, key in enumerate(KEYS)}
+
+    def __init__(self):
+        self.fixedKeys = DirectionCounter.KEYS
+        self.index = DirectionCounter.INDEX
+        self.counts = np.zeros(len(DirectionCounter.KEYS))
+        self.present = 0
+
+
 class Configuration:
     """
     A Configuration holds the (x,y) coordinate of a character, along with its
@@ -191,6 +209,57 @@ class AgentState:
         return self.configuration.isVisible()
 
 
+class AgentStateView:
+    """
+    A read-only view of an AgentState, as held by the observations handed
+    to agents (see GameState.makeObservation), which share their agent
+    states with the state of the game.
+
+    Attributes and methods are those of the AgentState, but setting an
+    attribute raises an AttributeError, and configurations are returned as
+    copies, so that agents can never modify the game through an
+    observation. copy() returns a modifiable AgentState.
+    """
+
+    __slots__ = ('_agentState',)
+
+    def __init__(self, agentState):
+        object.__setattr__(self, '_agentState', agentState)
+
+    def __getattr__(self, name):
+        # Special names are looked up by copy and pickle before the slot is
+        # set, and must not recurse
+        if name == '_agentState' or name.startswith('__'):
+            raise AttributeError(name)
+        value = getattr(self._agentState, name)
+        if isinstance(value, Configuration):
+            value = Configuration(value.pos, value.direction, value.visible)
+        return value
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Agent states of observations are read-only')
+
+    def __delattr__(self, name):
+        raise AttributeError('Agent states of observations are read-only')
+
+    def __str__(self):
+        return str(self._agentState)
+
+    def __eq__(self, other):
+        if isinstance(other, AgentStateView):
+            other = other._agentState
+        return self._agentState == other
+
+    def __hash__(self):
+        return hash(self._agentState)
+
+    def __reduce__(self):
+        return (AgentStateView, (self._agentState,))
+
+    def copy(self):
+        return self._agentState.copy()
+
+
 class Grid:
     """
     A 2-dimensional array of objects backed by a list of lists.  Data is accessed
@@ -320,6 +389,175 @@ class Grid:
         return bools
 
 
+class BitGrid:
+    """
+    A 2-dimensional array of booleans packed into a single Python integer.
+    Cell (x,y) is stored in bit x * height + y, so that a whole grid can be
+    copied, hashed and compared at machine-word level rather than cell by
+    cell.
+
+    Data is still accessed via grid[x][y] through lightweight column views,
+    which makes a BitGrid a drop-in replacement for a boolean Grid.
+
+    A frozen grid, such as the walls and the initial food of a Layout, raises
+    on writes; its copies are not frozen.
+    """
+
+    def __init__(self, width, height, initialValue=False, bits=None):
+        if initialValue not in [False, True]:
+            raise Exception('Grids can only contain booleans')
+
+        self.width = width
+        self.height = height
+        if bits is not None:
+            self.bits = bits
+        elif initialValue:
+            self.bits = (1 << (width * height)) - 1
+        else:
+            self.bits = 0
+        self._hash = None
+        self._columns = None
+        self.frozen = False
+
+    def __getitem__(self, x):
+        if x < 0:
+            x += self.width
+        if x < 0 or x >= self.width:
+            raise IndexError('grid column index out of range')
+        if self._columns is None:
+            self._columns = [None] * self.width
+        column = self._columns[x]
+        if column is None:
+            column = self._columns[x] = _BitGridColumn(self, x)
+        return column
+
+    def __setitem__(self, x, column):
+        for y, value in enumerate(column):
+            self.set(x, y, value)
+
+    def __len__(self):
+        return self.width
+
+    def __str__(self):
+        out = [[str(self.get(x, y))[0] for x in range(self.width)]
+               for y in range(self.height)]
+        out.reverse()
+        return '\n'.join([''.join(x) for x in out])
+
+    def __eq__(self, other):
+        if not isinstance(other, BitGrid):
+            return False
+        return self.bits == other.bits and \
+            self.width == other.width and self.height == other.height
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(self.bits)
+        return self._hash
+
+    def get(self, x, y):
+        return (self.bits >> (x * self.height + y)) & 1 == 1
+
+    def set(self, x, y, value):
+        if self.frozen:
+            raise AttributeError('Frozen grids are read-only')
+        bit = 1 << (x * self.height + y)
+        if value:
+            self.bits |= bit
+        else:
+            self.bits &= ~bit
+        self._hash = None
+
+    def copy(self):
+        g = BitGrid(self.width, self.height, bits=self.bits)
+        g._hash = self._hash
+        return g
+
+    def deepCopy(self):
+        return self.copy()
+
+    def shallowCopy(self):
+        # Integers are immutable, so a copy never aliases the data
+        return self.copy()
+
+    def count(self, item=True):
+        n = bin(self.bits).count('1')
+        if item:
+            return n
+        return self.width * self.height - n
+
+    def asList(self, key=True):
+        bits = self.bits
+        if not key:
+            bits = ~bits & ((1 << (self.width * self.height)) - 1)
+        list = []
+        while bits:
+            low = bits & -bits
+            list.append(divmod(low.bit_length() - 1, self.height))
+            bits ^= low
+        return list
+
+    def freeze(self):
+        """
+        Makes the grid read-only, and returns it.
+        """
+        self.frozen = True
+        return self
+
+    def cellIndex(self, x, y):
+        """
+        Returns the bit index of cell (x,y).
+        """
+        return x * self.height + y
+
+    def fromGrid(grid):
+        """
+        Builds a BitGrid holding the same booleans as a list-backed Grid.
+        """
+        g = BitGrid(grid.width, grid.height)
+        for x, y in grid.asList():
+            g.bits |= 1 << g.cellIndex(x, y)
+        return g
+    fromGrid = staticmethod(fromGrid)
+
+
+class _BitGridColumn:
+    """
+    A view on column x of a BitGrid, so that grid[x][y] reads and writes the
+    packed representation.
+    """
+    __slots__ = ('grid', 'x')
+
+    def __init__(self, grid, x):
+        self.grid = grid
+        self.x = x
+
+    def __getitem__(self, y):
+        height = self.grid.height
+        if y < 0:
+            y += height
+        if y < 0 or y >= height:
+            raise IndexError('grid row index out of range')
+        return (self.grid.bits >> (self.x * height + y)) & 1 == 1
+
+    def __setitem__(self, y, value):
+        if y < 0:
+            y += self.grid.height
+        if y < 0 or y >= self.grid.height:
+            raise IndexError('grid row index out of range')
+        if self.grid.frozen:
+            raise AttributeError('Frozen grids are read-only')
+        self.grid.set(self.x, y, value)
+
+    def __len__(self):
+        return self.grid.height
+
+    def __iter__(self):
+        bits = self.grid.bits >> (self.x * self.grid.height)
+        for y in range(self.grid.height):
+            yield (bits >> y) & 1 == 1
+
+
 def reconstituteGrid(bitRep):
     if not isinstance(bitRep, type((1, 2))):
         return bitRep
@@ -419,6 +657,93 @@ class Actions:
         return (x + dx, y + dy)
     getSuccessor = staticmethod(getSuccessor)
 
+    def getMazePath(start, goal, walls):
+        """
+        Returns a shortest list of cells leading from cell 'start' to cell
+        'goal' through the open cells of 'walls', both ends included, or
+        None if 'goal' cannot be reached.
+
+        The search is a bidirectional breadth-first search: it grows one
+        layer at a time from the end whose frontier is the smallest, and
+        stops when both searches meet, expanding about the square root of
+        the cells a one-sided search would.
+        """
+        if start == goal:
+            return [start]
+        parents = ({start: None}, {goal: None})
+        depths = ({start: 0}, {goal: 0})
+        frontiers = ([start], [goal])
+
+        while frontiers[0] and frontiers[1]:
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            parent, depth = parents[side], depths[side]
+            otherDepth = depths[1 - side]
+            frontier = []
+            meeting, length = None, None
+            for cell in frontiers[side]:
+                d = depth[cell] + 1
+                for neighbor in Actions.getLegalNeighbors(cell, walls):
+                    if neighbor in parent:
+                        continue
+                    parent[neighbor] = cell
+                    depth[neighbor] = d
+                    frontier.append(neighbor)
+                    if neighbor not in otherDepth:
+                        continue
+                    total = d + otherDepth[neighbor]
+                    if length is None or total < length:
+                        meeting, length = neighbor, total
+            if meeting is not None:
+                path = []
+                cell = meeting
+                while cell is not None:
+                    path.append(cell)
+                    cell = parents[0][cell]
+                path.reverse()
+                cell = parents[1][meeting]
+                while cell is not None:
+                    path.append(cell)
+                    cell = parents[1][cell]
+                return path
+            frontiers = (frontier, frontiers[1]) if side == 0 \
+                else (frontiers[0], frontier)
+        return None
+    getMazePath = staticmethod(getMazePath)
+
+    def getMazeDistance(start, goal, walls):
+        """
+        Returns the length of a shortest path from cell 'start' to cell
+        'goal', or None if 'goal' cannot be reached, see getMazePath.
+        """
+        path = Actions.getMazePath(start, goal, walls)
+        return None if path is None else len(path) - 1
+    getMazeDistance = staticmethod(getMazeDistance)
+
+
+class ZobristTable:
+    """
+    Assigns a random 64-bit key to each component a game state can hold
+    (an agent configuration, a food dot, a capsule, a score). The hash of a
+    state is the XOR of the keys of its components, so that it can be updated
+    incrementally when a component is added or removed. Keys are drawn
+    lazily, the first time a component is seen.
+    """
+
+    def __init__(self, seed=0):
+        self.keys = {}
+        self.random = random.Random(seed)
+
+    def __getitem__(self, component):
+        key = self.keys.get(component)
+        if key is None:
+            # setdefault is atomic: threads racing on a new component all
+            # get the key that was stored first
+            key = self.keys.setdefault(component, self.random.getrandbits(64))
+        return key
+
+
+ZOBRIST = ZobristTable()
+
 
 class GameStateData:
     """
@@ -429,17 +754,25 @@ class GameStateData:
         """
         Generates a new data packet by copying information from its predecessor.
         """
+        self._hash = None
+        # Indices of the agent states owned by this packet, or None while
+        # the whole list is still shared with the predecessor
+        self._ownedAgents = None
         if prevState is not None:
+            # Food grids are copied in O(1), capsules are an immutable tuple
+            # and agent states are copied on write, see getMutableAgentState
             self.food = prevState.food.shallowCopy()
-            self.capsules = prevState.capsules[:]
-            self.agentStates = self.copyAgentStates(prevState.agentStates)
+            self.capsules = prevState.capsules
+            self.agentStates = prevState.agentStates
             self.layout = prevState.layout
             self._eaten = prevState._eaten
             self.score = prevState.score
-            try:
-                self.beliefStates = np.copy(prevState.beliefStates)
-            except:
-                pass
+            self._hash = prevState._hash
+            # Belief states are read-only, see freezeBeliefStates, and only
+            # replaced by the belief state agent. Their presence tells
+            # whether ghosts are hidden, so they are only set if present.
+            if hasattr(prevState, 'beliefStates'):
+                self.beliefStates = prevState.beliefStates
 
         self._foodEaten = None
         self._foodAdded = None
@@ -449,26 +782,63 @@ class GameStateData:
         self._win = False
         self.scoreChange = 0
 
-    def deepCopy(self):
+    def shallowCopy(self):
+        """
+        Returns a copy sharing all its components with this one. Components
+        are copied on write by the game rules, so that modifying the copy
+        through them never affects the original.
+        """
         state = GameStateData(self)
-        state.food = self.food.deepCopy()
-        state.layout = self.layout.deepCopy()
         state._agentMoved = self._agentMoved
         state._foodEaten = self._foodEaten
         state._foodAdded = self._foodAdded
         state._capsuleEaten = self._capsuleEaten
-        try:
-            state.beliefStates = np.copy(self.beliefStates)
-        except:
-            pass
         return state
 
+    def deepCopy(self):
+        state = self.shallowCopy()
+        state.agentStates = self.copyAgentStates(self.agentStates)
+        state._ownedAgents = set(range(len(state.agentStates)))
+        state.food = self.food.deepCopy()
+        state.layout = self.layout.deepCopy()
+        return state
+
+    def freezeBeliefStates(beliefStates):
+        """
+        Returns 'beliefStates' as a tuple of read-only arrays, so that they
+        can be shared by all the successor states instead of being copied.
+        Arrays that are not read-only yet are copied once, since their owner
+        could still modify them.
+        """
+        frozen = []
+        for belief in beliefStates:
+            if not isinstance(belief, np.ndarray) or belief.flags.writeable:
+                belief = np.array(belief)
+                belief.flags.writeable = False
+            frozen.append(belief)
+        return tuple(frozen)
+    freezeBeliefStates = staticmethod(freezeBeliefStates)
+
     def copyAgentStates(self, agentStates):
         copiedStates = []
         for agentState in agentStates:
             copiedStates.append(agentState.copy())
         return copiedStates
 
+    def getMutableAgentState(self, index):
+        """
+        Returns the state of agent 'index', after copying it if it is still
+        shared with the predecessor packet. Game rules must go through this
+        method before modifying an agent state.
+        """
+        if self._ownedAgents is None:
+            self.agentStates = self.agentStates[:]
+            self._ownedAgents = set()
+        if index not in self._ownedAgents:
+            self.agentStates[index] = self.agentStates[index].copy()
+            self._ownedAgents.add(index)
+        return self.agentStates[index]
+
     def __eq__(self, other):
         """
         Allows two states to be compared.
@@ -489,28 +859,49 @@ class GameStateData:
     def __hash__(self):
         """
         Allows states to be keys of dictionaries.
+
+        The Zobrist hash is computed in full once, then maintained
+        incrementally by the game rules through the _hash* methods below.
+        """
+        if self._hash is None:
+            h = ZOBRIST[('score', self.score)]
+            for index in range(len(self.agentStates)):
+                h ^= self._agentKey(index)
+            for x, y in self.food.asList():
+                h ^= ZOBRIST[('food', x, y)]
+            for x, y in self.capsules:
+                h ^= ZOBRIST[('capsule', x, y)]
+            self._hash = h
+        return self._hash
+
+    def _agentKey(self, index):
+        agentState = self.agentStates[index]
+        configuration = agentState.configuration
+        return ZOBRIST[('agent', index, configuration.pos,
+                        configuration.direction, agentState.scaredTimer)]
+
+    def _hashAgent(self, index):
+        """
+        Toggles agent 'index' in the hash. Rules call it both before and
+        after modifying the agent state.
         """
-        for i, state in enumerate(self.agentStates):
-            try:
-                int(hash(state))
-            except TypeError as e:
-                print(e)
-                # hash(state)
-        return int(
-            (hash(
-                tuple(
-                    self.agentStates)) +
-                13 *
-                hash(
-                self.food) +
-                113 *
-                hash(
-                tuple(
-                    self.capsules)) +
-                7 *
-                hash(
-                self.score)) %
-            1048575)
+        if self._hash is not None:
+            self._hash ^= self._agentKey(index)
+
+    def _hashFood(self, position):
+        "Toggles the food dot at 'position' in the hash."
+        if self._hash is not None:
+            self._hash ^= ZOBRIST[('food',) + tuple(position)]
+
+    def _hashCapsule(self, position):
+        "Toggles the capsule at 'position' in the hash."
+        if self._hash is not None:
+            self._hash ^= ZOBRIST[('capsule',) + tuple(position)]
+
+    def _hashScore(self):
+        "Toggles the current score in the hash."
+        if self._hash is not None:
+            self._hash ^= ZOBRIST[('score', self.score)]
 
     def __str__(self):
         width, height = self.layout.width, self.layout.height
@@ -573,7 +964,7 @@ class GameStateData:
 
         self.food = layout.food.copy()
         #self.capsules = []
-        self.capsules = layout.capsules[:]
+        self.capsules = tuple(layout.capsules)
         self.layout = layout
         self.score = 0
         self.scoreChange = 0
@@ -609,7 +1000,8 @@ class GameStateData:
                              (-1,-1), False),
                              -1)
             self.agentStates.append(agtState)
-            self.beliefStates = [np.copy(uniformBelief) for _ in range(numGhosts)]
+            uniformBelief.flags.writeable = False
+            self.beliefStates = tuple(uniformBelief for _ in range(numGhosts))
 
 
 try:
@@ -703,7 +1095,7 @@ class Game:
             move_time = 0
             skip_action = False
             # Generate an observation of the state
-            observation = self.state.deepCopy()
+            observation = self.state.makeObservation(agentIndex)
             # Solicit an action
             action = None
             self.mute(agentIndex)
@@ -16,8 +16,9 @@
 from .game import Agent
 from .game import Actions
 from .game import Directions
+from .game import DirectionCounter
 from .util import manhattanDistance
-from .util import PriorityQueue
+from .util import nearestPoint
 from . import util
 import numpy as np
 
@@ -35,7 +36,7 @@ class GhostAgent(Agent):
             return util.chooseFromDistribution(dist)
 
     def getDistribution(self, state):
-        """Returns a Counter encoding a distribution
+        """Returns a DirectionCounter encoding a distribution
            over actions from the provided state."""
         util.raiseNotDefined()
 
@@ -47,7 +48,7 @@ class EastRandyGhost(GhostAgent):
         """
         Returns uniform discrete distribution over legal actions
         """
-        dist = util.Counter()
+        dist = DirectionCounter()
         legal = state.getLegalActions(self.index)
         len_legal = len(legal)
         for a in legal:
@@ -71,7 +72,7 @@ class EastRandyGhost(GhostAgent):
         N = len(legal)
         if Directions.EAST in legal:
             # Select EAST with probability p
-            dist = util.Counter()
+            dist = DirectionCounter()
             dist[Directions.EAST] = 1 if len(legal) == 1 and args.p==0 else args.p
 
             for a in legal:
@@ -97,7 +98,7 @@ class DumbyGhost(GhostAgent):
     "A dumb ghost."
 
     def getDistribution(self, state):
-        dist = util.Counter()
+        dist = DirectionCounter()
         legal = state.getLegalActions(self.index)
         current = state.getGhostState(self.index).configuration.direction
         if current == Directions.STOP:
@@ -157,7 +158,7 @@ class GreedyGhost(GhostAgent):
                 distancesToPacman) if distance == bestScore][0]]
 
         # Construct distribution
-        dist = util.Counter()
+        dist = DirectionCounter()
         for a in bestActions:
             dist[a] = bestProb / len(bestActions)
         for a in legalActions:
@@ -173,79 +174,25 @@ class SmartyGhost(GhostAgent):
     def __init__(self, index, args):
         GhostAgent.__init__(self, index, args)
         self.index = index
-        self.fscore = None
-        self.gscore = None
         self.wasScared = False
         self.corners = None
         self.gghost = GreedyGhost(index, args)
 
-    def _pathsearch(self, state, fscore_in, gscore_in, goal):
-        fringe = PriorityQueue()
-        closed = np.full(
-            (state.data.layout.width,
-             state.data.layout.height),
-            False)
-        initpos = tuple(map(lambda x: int(x),
-                            state.getGhostPosition(self.index)))
-        if gscore_in is not None:
-            gscore = gscore_in
-        else:
-            gscore = np.full(
-                (state.data.layout.width, state.data.layout.height), np.inf)
-            gscore[initpos] = 0
-        if fscore_in is not None:
-            fscore = fscore_in
-        else:
-            fscore = np.full(
-                (state.data.layout.width, state.data.layout.height), np.inf)
-            fscore[initpos] = manhattanDistance(goal, initpos)
-        fringe.push((state, [], closed), fscore[initpos])
-        openset = np.full(
-            (state.data.layout.width, state.data.layout.height), False)
-        openset[initpos] = True
-        while not fringe.isEmpty():
-            _, node = fringe.pop()
-            curNode, actions, closed = node
-            if curNode.getGhostPosition(self.index) == goal:
-                return actions[0], fscore, gscore
-            closed = np.copy(closed)
-            ghostpos = tuple(
-                map(lambda x: int(x), curNode.getGhostPosition(self.index)))
-            closed[ghostpos] = True
-            openset[ghostpos] = False
-            succs = [(curNode.generateSuccessor(self.index, action), action)
-                     for action in curNode.getLegalActions(self.index)]
-
-            for succNode in succs:
-                action = succNode[1]
-                succNode = succNode[0]
-
-                succghostpos = tuple(
-                    map(lambda x: int(x),
-                        succNode.getGhostPosition(self.index)))
-                tentative_gscore = gscore[succghostpos] + 1
-                tentative_fscore = tentative_gscore + \
-                    manhattanDistance(goal, succghostpos)
-
-                if closed[succghostpos]:
-                    if tentative_fscore <= fscore[succghostpos]:
-                        closed[succghostpos] = False
-                    else:
-                        continue
-
-                if not openset[succghostpos]:
-                    openset[succghostpos] = True
-                elif tentative_gscore >= gscore[succghostpos]:
-                    continue
-
-                gscore[succghostpos] = tentative_gscore
-                fscore[succghostpos] = tentative_fscore
-                fringe.push(
-                    (succNode,
-                     actions + [action],
-                        closed),
-                    fscore[succghostpos])
-        return actions[0], fscore, gscore
+    def _pathsearch(self, state, legalActions, goal):
+        """
+        Returns the legal action leading to the cell the closest to 'goal'
+        in maze distance.
+        """
+        walls = state.getWalls()
+        ghostpos = nearestPoint(state.getGhostPosition(self.index))
+        bestAction, bestDistance = legalActions[0], None
+        for action in legalActions:
+            distance = Actions.getMazeDistance(
+                Actions.getSuccessor(ghostpos, action), goal, walls)
+            if distance is not None and \
+                    (bestDistance is None or distance < bestDistance):
+                bestAction, bestDistance = action, distance
+        return bestAction
 
     def getDistribution(self, state):
         if self.corners is None:
@@ -260,7 +207,7 @@ class SmartyGhost(GhostAgent):
                  state.data.layout.height)]
         ghostState = state.getGhostState(self.index)
         isScared = ghostState.scaredTimer > 0
-        dist = util.Counter()
+        dist = DirectionCounter()
         legalActions = state.getLegalActions(self.index)
         for a in legalActions:
             dist[a] = 0
@@ -273,9 +220,8 @@ class SmartyGhost(GhostAgent):
                                self.corners)))
         ]
         if not isScared:
-            a, self.fscore, self.gscore = self._pathsearch(
-                state, self.fscore, self.gscore, goal)
-            dist[a] = 1
+            if legalActions:
+                dist[self._pathsearch(state, legalActions, goal)] = 1
         else:
             dist = self.gghost.getDistribution(state)
 
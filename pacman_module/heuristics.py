@@ -0,0 +1,263 @@
+# heuristics.py
+# -------------
+# Admissible heuristics for the problem of eating all the food dots of a
+# layout, based on the maze distances of layout.DistanceTable.
+
+
+"""
+Each heuristic takes Pacman's position, the remaining food and the layout,
+and returns a lower bound on the number of moves needed to eat all the
+food. The food can be given either as a BitGrid (e.g. state.getFood()) or
+as the food bitmask of a pacman.PacmanSearchProblem state.
+
+Computations are vectorized over the rows of the distance matrix, and
+results are memoized by food bitmask, so that states sharing the same
+remaining food (and position) are evaluated only once. Memoized entries
+are as large as their bitmask keys, which grow with the layout, so caches
+are bounded by the estimated size of their entries rather than by their
+number of entries. Each distance table has its own caches, which are only
+weakly referenced, so that they are freed along with the table.
+
+Layouts too large to have a distance table (see Layout.getDistanceTable)
+fall back to the same bounds computed on Manhattan distances, which are
+looser but still admissible.
+"""
+
+import sys
+import weakref
+from collections import OrderedDict
+from functools import wraps
+
+import numpy as np
+
+# Maximum estimated size in bytes of the entries of each cache, per table
+CACHE_BYTES = 16 * 2 ** 20
+# Estimated size in bytes of a cache entry, besides its key and value
+ENTRY_OVERHEAD = 200
+
+
+def farthestFoodDistance(position, food, layout):
+    """
+    Returns the maze distance to the farthest food dot.
+    """
+    table = layout.getDistanceTable()
+    if table is None:
+        return _manhattanFarthest(layout, position, _foodMask(food))
+    return _farthest(table, layout.height, position, _foodMask(food))
+
+
+def foodMSTDistance(position, food, layout):
+    """
+    Returns the weight of the minimum spanning tree of the food dots, plus
+    the maze distance to the closest one. Any path eating all the food
+    first reaches some dot, then visits all the others, which costs at least
+    the weight of a spanning tree.
+    """
+    table = layout.getDistanceTable()
+    if table is None:
+        return _manhattanMST(layout, position, _foodMask(food))
+    return _mst(table, layout.height, position, _foodMask(food))
+
+
+def twoFarthestFoodDistance(position, food, layout):
+    """
+    Returns the largest cost, over all pairs of food dots (a, b), of going
+    to the closest of the two and then to the other one.
+    """
+    table = layout.getDistanceTable()
+    if table is None:
+        return _manhattanTwoFarthest(layout, position, _foodMask(food))
+    return _twoFarthest(table, layout.height, position, _foodMask(food))
+
+
+def _foodMask(food):
+    return food if isinstance(food, int) else food.bits
+
+
+def _sizeOf(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, tuple):
+        return sum(_sizeOf(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class _Memo:
+    """
+    A least recently used cache bounded by the estimated size in bytes of
+    its entries.
+    """
+
+    def __init__(self, maxBytes=CACHE_BYTES):
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value):
+        weight = _sizeOf(key) + _sizeOf(value) + ENTRY_OVERHEAD
+        if weight > self.maxBytes:
+            return
+        self.entries[key] = (value, weight)
+        self.size += weight
+        while self.size > self.maxBytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= evicted
+
+
+def _memoize(function):
+    """
+    Decorator memoizing 'function', whose first argument is a distance
+    table (or a layout), in a _Memo per table.
+    """
+    memos = weakref.WeakKeyDictionary()
+
+    @wraps(function)
+    def memoized(table, *args):
+        memo = memos.get(table)
+        if memo is None:
+            memo = memos[table] = _Memo()
+        value = memo.get(args)
+        if value is None:
+            value = function(table, *args)
+            memo.put(args, value)
+        return value
+
+    memoized.memos = memos
+    return memoized
+
+
+@_memoize
+def _foodIndices(table, height, mask):
+    """
+    Returns the distance table indices of the cells set in 'mask'.
+    """
+    indices = []
+    while mask:
+        low = mask & -mask
+        indices.append(table.index[divmod(low.bit_length() - 1, height)])
+        mask ^= low
+    return np.array(indices, dtype=np.intp)
+
+
+@_memoize
+def _foodTreeWeight(table, height, mask):
+    """
+    Returns the weight of the minimum spanning tree of the food dots of
+    'mask'.
+    """
+    indices = _foodIndices(table, height, mask)
+    return _treeWeight(table.matrix[np.ix_(indices, indices)])
+
+
+def _treeWeight(distances):
+    """
+    Returns the weight of the minimum spanning tree of the complete graph
+    whose edge weights are given by the matrix 'distances', computed with
+    Prim's algorithm.
+    """
+    distances = distances.astype(np.int64)
+    n = len(distances)
+    if n <= 1:
+        return 0
+
+    inTree = np.zeros(n, dtype=bool)
+    inTree[0] = True
+    best = distances[0].copy()
+    best[0] = np.iinfo(np.int64).max
+    weight = 0
+    for _ in range(n - 1):
+        i = int(np.argmin(best))
+        weight += int(best[i])
+        inTree[i] = True
+        best = np.minimum(best, distances[i])
+        best[inTree] = np.iinfo(np.int64).max
+    return weight
+
+
+@_memoize
+def _farthest(table, height, position, mask):
+    indices = _foodIndices(table, height, mask)
+    if len(indices) == 0:
+        return 0
+    return int(table.matrix[table.index[position], indices].max())
+
+
+@_memoize
+def _mst(table, height, position, mask):
+    indices = _foodIndices(table, height, mask)
+    if len(indices) == 0:
+        return 0
+    closest = int(table.matrix[table.index[position], indices].min())
+    return closest + _foodTreeWeight(table, height, mask)
+
+
+@_memoize
+def _twoFarthest(table, height, position, mask):
+    indices = _foodIndices(table, height, mask)
+    if len(indices) == 0:
+        return 0
+    toFood = table.matrix[table.index[position], indices].astype(np.int64)
+    # Pairs (a, a) account for the farthest single dot
+    costs = np.minimum.outer(toFood, toFood) + \
+        table.matrix[np.ix_(indices, indices)]
+    return int(costs.max())
+
+
+@_memoize
+def _foodCells(layout, mask):
+    """
+    Returns the array of the (x, y) coordinates of the cells set in 'mask'.
+    """
+    cells = []
+    while mask:
+        low = mask & -mask
+        cells.append(divmod(low.bit_length() - 1, layout.height))
+        mask ^= low
+    return np.array(cells, dtype=np.int64).reshape(-1, 2)
+
+
+def _manhattanTo(cells, position):
+    return np.abs(cells - np.array(position, dtype=np.int64)).sum(axis=1)
+
+
+def _manhattanMatrix(cells):
+    return np.abs(cells[:, np.newaxis] - cells[np.newaxis]).sum(axis=2)
+
+
+@_memoize
+def _manhattanFarthest(layout, position, mask):
+    cells = _foodCells(layout, mask)
+    if len(cells) == 0:
+        return 0
+    return int(_manhattanTo(cells, position).max())
+
+
+@_memoize
+def _manhattanTreeWeight(layout, mask):
+    return _treeWeight(_manhattanMatrix(_foodCells(layout, mask)))
+
+
+@_memoize
+def _manhattanMST(layout, position, mask):
+    cells = _foodCells(layout, mask)
+    if len(cells) == 0:
+        return 0
+    closest = int(_manhattanTo(cells, position).min())
+    return closest + _manhattanTreeWeight(layout, mask)
+
+
+@_memoize
+def _manhattanTwoFarthest(layout, position, mask):
+    cells = _foodCells(layout, mask)
+    if len(cells) == 0:
+        return 0
+    toFood = _manhattanTo(cells, position)
+    costs = np.minimum.outer(toFood, toFood) + _manhattanMatrix(cells)
+    return int(costs.max())
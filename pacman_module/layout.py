@@ -13,35 +13,224 @@
 
 
 from .util import manhattanDistance
-from .game import Grid
+from .game import Grid, BitGrid, Actions, Directions
+from . import layoutGenerator
 import os
 import random
+import re
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict, deque
 from functools import reduce
+import numpy as np
 
 VISIBILITY_MATRIX_CACHE = {}
+AGENT_OR_CAPSULE = re.compile('[oPG1-4]')
+# Distance tables, keyed by layout text digest, least recently used first.
+# Tables of large layouts weigh hundreds of megabytes, so few are kept.
+DISTANCE_TABLE_CACHE = OrderedDict()
+DISTANCE_TABLE_CACHE_SIZE = 4
+# Layouts with more open cells have no table: the int16 matrix would weigh
+# more than 128 MiB and take minutes to compute
+DISTANCE_TABLE_MAX_CELLS = 8192
+CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'pacman_module')
+LAYOUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'layouts')
+# Parsed layouts, keyed by generated layout name or by file path,
+# modification time and size, least recently used first
+LAYOUT_CACHE = OrderedDict()
+LAYOUT_CACHE_SIZE = 32
+# Version of the pickled layouts, to be increased when Layout changes
+LAYOUT_CACHE_VERSION = 5
+# Guards the lookups and updates of the in-memory caches, which layouts and
+# tables may be loaded by several threads at once. Loading itself runs
+# unlocked.
+CACHE_LOCK = threading.Lock()
 
 
 class Layout:
     """
     A Layout manages the static information about the game board.
+
+    Layouts are never modified once built: game states, copies and
+    observations all share the same instance.
     """
 
     def __init__(self, layoutText):
         self.width = len(layoutText[0])
         self.height = len(layoutText)
-        self.walls = Grid(self.width, self.height, False)
-        self.food = Grid(self.width, self.height, False)
+        self.walls = BitGrid(self.width, self.height, False)
+        self.food = BitGrid(self.width, self.height, False)
         self.capsules = []
         self.agentPositions = []
         self.numGhosts = 0
         self.processLayoutText(layoutText)
+        self.walls.freeze()
+        self.food.freeze()
         self.layoutText = layoutText
-        self.totalFood = len(self.food.asList())
+        self.totalFood = self.food.count()
+        self.distanceKey = None
+        self.legalMoves = None
+        self.legalActions = None
+        self.corridors = None
+        self.pockets = None
         # self.initializeVisibilityMatrix()
 
+    def __getstate__(self):
+        # Tables computed on demand are not worth storing
+        state = dict(self.__dict__)
+        state['legalMoves'] = None
+        state['legalActions'] = None
+        state['corridors'] = None
+        state['pockets'] = None
+        return state
+
     def getNumGhosts(self):
         return self.numGhosts
 
+    def getDistanceTable(self):
+        """
+        Returns the DistanceTable holding the maze distances between all the
+        open cells of the layout. It is computed on first use, and cached
+        both on disk and in DISTANCE_TABLE_CACHE, keyed by the layout text.
+        Layouts do not hold their table, so that evicted tables are freed.
+
+        Returns None if the layout has more than DISTANCE_TABLE_MAX_CELLS
+        open cells.
+        """
+        if self.width * self.height - self.walls.count() > \
+                DISTANCE_TABLE_MAX_CELLS:
+            return None
+        if self.distanceKey is None:
+            self.distanceKey = hashlib.sha1(
+                '\n'.join(self.layoutText).encode()).hexdigest()
+        key = self.distanceKey
+        with CACHE_LOCK:
+            table = DISTANCE_TABLE_CACHE.get(key)
+            if table is not None:
+                DISTANCE_TABLE_CACHE.move_to_end(key)
+                return table
+
+        table = DistanceTable.load(self.walls, key)
+        with CACHE_LOCK:
+            DISTANCE_TABLE_CACHE[key] = table
+            while len(DISTANCE_TABLE_CACHE) > DISTANCE_TABLE_CACHE_SIZE:
+                DISTANCE_TABLE_CACHE.popitem(last=False)
+        return table
+
+    def getMazeDistance(self, pos1, pos2):
+        """
+        Returns the length of the shortest path between two open cells.
+        Without a distance table, the path is searched for, see
+        Actions.getMazeDistance.
+        """
+        table = self.getDistanceTable()
+        if table is None:
+            return Actions.getMazeDistance(pos1, pos2, self.walls)
+        return table.getDistance(pos1, pos2)
+
+    def getLegalMoves(self, position):
+        """
+        Returns the tuple of (action, next cell) pairs available on the open
+        cell 'position', Directions.STOP included, in the order of
+        Actions.getPossibleActions. Returns None if 'position' is not an open
+        cell, e.g. when an agent is between two cells.
+        """
+        if self.legalMoves is None:
+            self.initializeLegalMoves()
+        return self.legalMoves.get(position)
+
+    def getLegalActions(self, position):
+        """
+        Returns the tuple of the actions of getLegalMoves(position), or None
+        if 'position' is not an open cell.
+        """
+        if self.legalActions is None:
+            self.initializeLegalMoves()
+        return self.legalActions.get(position)
+
+    def initializeLegalMoves(self):
+        walls = self.walls
+        self.legalMoves = {}
+        self.legalActions = {}
+        for x, y in walls.asList(False):
+            moves = []
+            for action, (dx, dy) in Actions._directionsAsList:
+                nextX, nextY = x + dx, y + dy
+                if 0 <= nextX < self.width and 0 <= nextY < self.height \
+                        and not walls.get(nextX, nextY):
+                    moves.append((action, (nextX, nextY)))
+            self.legalMoves[(x, y)] = tuple(moves)
+            self.legalActions[(x, y)] = tuple(action for action, _ in moves)
+
+    def getCorridorGraph(self):
+        """
+        Returns the CorridorGraph of the layout, built on first use.
+        """
+        if self.corridors is None:
+            self.corridors = CorridorGraph(self)
+        return self.corridors
+
+    def getPockets(self):
+        """
+        Returns the dead-end pockets of the layout, as a dictionary mapping
+        each pocket cell to a pair (parent, food): 'parent' is the neighbor
+        leading out of the pocket (None for the last cell of a maze without
+        cycles), and 'food' is the bitmask of the initial food of the
+        sub-pocket behind the cell, the cell included.
+
+        Pockets are found by repeatedly removing the open cells with at most
+        one remaining open neighbor: what is left are the cycles of the maze
+        and the paths between them. Entering a cell from its parent only
+        leads deeper into its sub-pocket, which is useless once 'food' has
+        been eaten: the analysis is computed once, and checking it against
+        the remaining food is a single bitwise and.
+        """
+        if self.pockets is None:
+            self.initializePockets()
+        return self.pockets
+
+    def initializePockets(self):
+        degrees = {}
+        for cell in self.walls.asList(False):
+            degrees[cell] = len(self.getLegalMoves(cell)) - 1
+        fringe = deque(cell for cell, degree in degrees.items()
+                       if degree <= 1)
+        removed = set(fringe)
+        order = []
+        parents = {}
+        while fringe:
+            cell = fringe.popleft()
+            order.append(cell)
+            parents[cell] = None
+            for action, next in self.getLegalMoves(cell):
+                if action == Directions.STOP or next in removed:
+                    continue
+                # At most one neighbor remains: the way out of the pocket
+                parents[cell] = next
+                degrees[next] -= 1
+                if degrees[next] <= 1:
+                    removed.add(next)
+                    fringe.append(next)
+
+        # Cells are removed after all their children: masks are computed
+        # from the leaves, sharing the mask of an only child when possible
+        masks = {}
+        height = self.height
+        for cell in order:
+            mask = masks.get(cell, 0)
+            if self.food[cell[0]][cell[1]]:
+                mask = mask | 1 << (cell[0] * height + cell[1])
+            masks[cell] = mask
+            parent = parents[cell]
+            if parent is not None and mask:
+                masks[parent] = masks[parent] | mask \
+                    if masks.get(parent, 0) else mask
+        self.pockets = {cell: (parents[cell], masks[cell]) for cell in order}
+
     def initializeVisibilityMatrix(self):
         global VISIBILITY_MATRIX_CACHE
         if reduce(str.__add__, self.layoutText) not in VISIBILITY_MATRIX_CACHE:
@@ -117,7 +306,8 @@ class Layout:
         return "\n".join(self.layoutText)
 
     def deepCopy(self):
-        return Layout(self.layoutText[:])
+        # Layouts are immutable, so a copy is the layout itself
+        return self
 
     def processLayoutText(self, layoutText):
         """
@@ -132,12 +322,24 @@ class Layout:
          P - Pacman
         Other characters are ignored.
         """
+        if any(len(line) < self.width for line in layoutText):
+            raise Exception('Layout lines must all have the same width')
+        # Column x of the text, read from top to bottom, holds the bits of
+        # cells (x, height - 1) to (x, 0): concatenating the columns from
+        # right to left gives the binary digits of the whole grid, which
+        # builds it in linear time
+        columns = [''.join(column) for column in zip(*layoutText)]
+        columns = columns[:self.width]
+        self.walls.bits = _gridBits(columns, '%')
+        self.food.bits = _gridBits(columns, '.')
+
         maxY = self.height - 1
         for y in range(self.height):
-            for x in range(self.width):
-                layoutChar = layoutText[maxY - y][x]
-                self.processLayoutChar(x, y, layoutChar)
-        self.agentPositions.sort()
+            line = layoutText[maxY - y]
+            for match in AGENT_OR_CAPSULE.finditer(line, 0, self.width):
+                self.processLayoutChar(match.start(), y, match.group())
+        self.agentPositions = tuple(sorted(self.agentPositions))
+        self.capsules = tuple(self.capsules)
         #self.agentPositions = [(i, pos) for i, pos in self.agentPositions]
 
     def processLayoutChar(self, x, y, layoutChar):
@@ -158,23 +360,246 @@ class Layout:
             self.numGhosts += 1
 
 
-def getLayout(name, back=2):
-    if name.endswith('.lay'):
-        layout = tryToLoad('pacman_module/layouts/' + name)
-        if layout is None:
-            layout = tryToLoad(name)
+def _gridBits(columns, char):
+    """
+    Returns the BitGrid bits of the cells holding 'char' in the layout text
+    columns.
+    """
+    table = {ord(c): '0' for c in set(''.join(columns)) if c != char}
+    table[ord(char)] = '1'
+    digits = ''.join(reversed(columns)).translate(table)
+    return int(digits, 2) if digits else 0
+
+
+class CorridorGraph:
+    """
+    A CorridorGraph compresses the open cells of a layout into a graph whose
+    nodes are the junctions, dead ends, food, capsule and agent start cells.
+    All the other cells have exactly two open neighbors: they form the
+    corridors linking the nodes, which never hold food nor capsules.
+
+    A corridor is a pair (actions, cells) of tuples: the moves followed from
+    a cell, and the cells reached by each of them, the last one being a
+    node. Its length is len(cells).
+    """
+
+    def __init__(self, layout):
+        self.layout = layout
+        special = set(layout.food.asList())
+        special.update(layout.capsules)
+        special.update(position for _, position in layout.agentPositions)
+
+        nodes = set()
+        for cell in layout.walls.asList(False):
+            moves = layout.getLegalMoves(cell)
+            # Directions.STOP is always legal
+            if len(moves) != 3 or cell in special:
+                nodes.add(cell)
+        self.nodes = frozenset(nodes)
+
+        self.corridors = {}
+        for node in self.nodes:
+            self.getCorridors(node)
+
+    def getCorridors(self, cell):
+        """
+        Returns the tuple of the corridors leaving the open cell 'cell',
+        which needs not be a node, one per legal move but Directions.STOP.
+        """
+        corridors = self.corridors.get(cell)
+        if corridors is None:
+            corridors = []
+            for action, next in self.layout.getLegalMoves(cell):
+                if action == Directions.STOP:
+                    continue
+                corridor = self.followCorridor(cell, action, next)
+                if corridor is not None:
+                    corridors.append(corridor)
+            corridors = self.corridors[cell] = tuple(corridors)
+        return corridors
+
+    def followCorridor(self, start, action, cell):
+        """
+        Returns the corridor leaving 'start' by taking 'action' to 'cell', or
+        None if it loops back to 'start' without meeting any node.
+        """
+        actions = [action]
+        cells = [cell]
+        previous = start
+        while cell not in self.nodes:
+            if cell == start:
+                return None
+            for action, next in self.layout.getLegalMoves(cell):
+                if action != Directions.STOP and next != previous:
+                    break
+            previous, cell = cell, next
+            actions.append(action)
+            cells.append(cell)
+        return tuple(actions), tuple(cells)
+
+
+class DistanceTable:
+    """
+    A DistanceTable stores the maze distances between all pairs of open
+    cells of a layout in a NumPy matrix. Cells are numbered in column-major
+    order, i.e. in the order of walls.asList(False), and distances between
+    disconnected cells are set to the largest value of the matrix dtype.
+    """
+
+    def __init__(self, cells, matrix):
+        self.cells = cells
+        self.index = {cell: i for i, cell in enumerate(cells)}
+        self.matrix = matrix
+        self.unreachable = np.iinfo(matrix.dtype).max
+
+    def getDistance(self, pos1, pos2):
+        return int(self.matrix[self.index[pos1], self.index[pos2]])
+
+    def compute(walls):
+        """
+        Computes the table of a walls Grid with one breadth-first search
+        from every open cell.
+        """
+        cells = walls.asList(False)
+        index = {cell: i for i, cell in enumerate(cells)}
+        neighbors = []
+        for x, y in cells:
+            neighbors.append([index[n] for n in
+                              ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y))
+                              if n in index])
+
+        n = len(cells)
+        dtype = np.int16 if n <= np.iinfo(np.int16).max else np.int32
+        matrix = np.full((n, n), np.iinfo(dtype).max, dtype=dtype)
+        for source in range(n):
+            dist = [-1] * n
+            dist[source] = 0
+            fringe = deque([source])
+            while fringe:
+                i = fringe.popleft()
+                d = dist[i] + 1
+                for j in neighbors[i]:
+                    if dist[j] < 0:
+                        dist[j] = d
+                        fringe.append(j)
+            row = np.array(dist, dtype=dtype)
+            row[row < 0] = np.iinfo(dtype).max
+            matrix[source] = row
+        return DistanceTable(cells, matrix)
+    compute = staticmethod(compute)
+
+    def load(walls, key):
+        """
+        Loads the table of a walls Grid from the disk cache, computing and
+        saving it if it is missing. Failing to use the cache is not an error.
+        """
+        cells = walls.asList(False)
+        path = os.path.join(CACHE_DIR, 'distances-%s.npy' % key)
+        try:
+            matrix = np.load(path)
+            if matrix.shape == (len(cells), len(cells)):
+                return DistanceTable(cells, matrix)
+        except (OSError, ValueError):
+            pass
+
+        table = DistanceTable.compute(walls)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            # Write then rename, so that concurrent games never read a
+            # partially written file
+            tmp = '%s.%d.tmp' % (path, os.getpid())
+            with open(tmp, 'wb') as f:
+                np.save(f, table.matrix)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+        return table
+    load = staticmethod(load)
+
+
+def getLayout(name, back=2, diskCache=False):
+    """
+    Returns the Layout called 'name', or None if there is none.
+
+    'name' is either a generated layout name (see layoutGenerator) or the
+    path of a layout file, with or without its .lay extension, see
+    findLayoutFile. Layouts are immutable, so the same instance is returned
+    as long as the file is not modified. With 'diskCache', parsed and
+    generated layouts are also cached on disk, for other processes.
+    """
+    spec = layoutGenerator.parseSpec(name)
+    if spec is not None:
+        key = name
     else:
-        layout = tryToLoad('pacman_module/layouts/' + name + '.lay')
-        if layout is None:
-            layout = tryToLoad(name + '.lay')
-    if layout is None and back >= 0:
-        curdir = os.path.abspath('.')
-        os.chdir('..')
-        layout = getLayout(name, back - 1)
-        os.chdir(curdir)
+        path = findLayoutFile(name, back)
+        if path is None:
+            return None
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+
+    with CACHE_LOCK:
+        layout = LAYOUT_CACHE.get(key)
+        if layout is not None:
+            LAYOUT_CACHE.move_to_end(key)
+            return layout
+
+    cachePath = None
+    if diskCache:
+        digest = hashlib.sha1(repr((LAYOUT_CACHE_VERSION, key)).encode())
+        cachePath = os.path.join(
+            CACHE_DIR, 'layout-%s.pickle' % digest.hexdigest())
+        try:
+            with open(cachePath, 'rb') as f:
+                layout = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+    if layout is None:
+        if spec is not None:
+            layout = Layout(layoutGenerator.generateLayoutText(**spec))
+        else:
+            layout = tryToLoad(path)
+        if cachePath is not None:
+            try:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                tmp = '%s.%d.tmp' % (cachePath, os.getpid())
+                with open(tmp, 'wb') as f:
+                    pickle.dump(layout, f, pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, cachePath)
+            except OSError:
+                pass
+
+    with CACHE_LOCK:
+        LAYOUT_CACHE[key] = layout
+        while len(LAYOUT_CACHE) > LAYOUT_CACHE_SIZE:
+            LAYOUT_CACHE.popitem(last=False)
     return layout
 
 
+def findLayoutFile(name, back=2):
+    """
+    Returns the absolute path of the layout file 'name', or None if there is
+    none. The file is looked up in the layouts folder of the current
+    directory, then in the current directory itself, and so on in up to
+    'back' parent directories, and finally in the layouts folder of this
+    package. The working directory is never changed.
+    """
+    filename = name if name.endswith('.lay') else name + '.lay'
+    directory = os.path.abspath('.')
+    candidates = []
+    for _ in range(back + 1):
+        candidates.append(
+            os.path.join(directory, 'pacman_module', 'layouts', filename))
+        candidates.append(os.path.join(directory, filename))
+        directory = os.path.dirname(directory)
+    candidates.append(os.path.join(LAYOUT_DIR, filename))
+
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
 def tryToLoad(fullname):
     if(not os.path.exists(fullname)):
         return None
@@ -0,0 +1,256 @@
+# layoutGenerator.py
+# ------------------
+# Procedural generation of Pacman layouts of arbitrary size, e.g. to
+# measure how agents scale with the size of the maze.
+
+
+"""
+Three kinds of layouts can be generated:
+
+- 'maze': a perfect maze (a single path between any two cells) carved by
+  a randomized depth-first search, with corridors one cell wide;
+- 'rooms': open rooms separated by walls with doors, built by recursive
+  division;
+- 'open': an open field with randomly scattered wall cells.
+
+Every layout is surrounded by walls and has all its open cells connected.
+Generation only depends on the parameters, including the seed, so that
+generated layouts are reproducible.
+
+Layouts can also be described by a name of the form
+'<kind>-<width>x<height>[-<parameter>=<value>]...', e.g.
+'maze-101x101-seed=3-food=20', which layout.getLayout accepts anywhere a
+layout file name is expected.
+"""
+
+import random
+import re
+from collections import deque
+
+KINDS = ('maze', 'rooms', 'open')
+
+SPEC_PATTERN = re.compile(
+    r'^(%s)-(\d+)x(\d+)((?:-\w+=[0-9.]+)*)$' % '|'.join(KINDS))
+INT_PARAMETERS = ('seed', 'food', 'capsules', 'ghosts', 'room')
+FLOAT_PARAMETERS = ('density', 'loops', 'walls')
+
+
+def generateLayoutText(kind, width, height, seed=0, food=None, density=1.0,
+                       capsules=0, ghosts=0, loops=0.0, room=5, walls=0.2):
+    """
+    Returns the text of a generated layout, as a list of lines.
+
+    Arguments:
+    ----------
+    - `kind`: 'maze', 'rooms' or 'open'.
+    - `width`, `height`: size of the layout, walls included (at least 3).
+    - `seed`: seed of the random number generator.
+    - `food`: number of food dots, or None to use `density` instead.
+    - `density`: fraction of the free open cells holding a food dot.
+    - `capsules`: number of capsules.
+    - `ghosts`: number of ghosts.
+    - `loops`: probability of removing each wall separating two
+      corridors ('maze' and 'rooms' only), to create loops.
+    - `room`: minimum size of the rooms ('rooms' only).
+    - `walls`: fraction of the cells that are walls ('open' only).
+    """
+    if kind not in KINDS:
+        raise ValueError('Unknown layout kind %s' % kind)
+    if width < 3 or height < 3:
+        raise ValueError('Layouts must be at least 3x3')
+
+    rng = random.Random(seed)
+    grid = [['%'] * width for _ in range(height)]
+    if kind == 'maze':
+        _carveMaze(grid, rng)
+    elif kind == 'rooms':
+        _divideRooms(grid, rng, max(room, 1))
+    else:
+        _scatterWalls(grid, rng, walls)
+    if kind != 'open' and loops > 0:
+        _addLoops(grid, rng, loops)
+
+    cells = _connectedCells(grid)
+    if len(cells) < 1 + ghosts + capsules:
+        raise ValueError('Not enough open cells for the agents and capsules')
+
+    rng.shuffle(cells)
+    r, c = cells.pop()
+    grid[r][c] = 'P'
+    for _ in range(ghosts):
+        r, c = cells.pop()
+        grid[r][c] = 'G'
+    for _ in range(capsules):
+        r, c = cells.pop()
+        grid[r][c] = 'o'
+    if food is None:
+        food = int(round(density * len(cells)))
+    for r, c in cells[:food]:
+        grid[r][c] = '.'
+
+    return [''.join(row) for row in grid]
+
+
+def generateLayout(kind, width, height, **kwargs):
+    """
+    Returns a generated Layout, see generateLayoutText for the arguments.
+    """
+    from .layout import Layout
+    return Layout(generateLayoutText(kind, width, height, **kwargs))
+
+
+def parseSpec(name):
+    """
+    Returns the arguments of generateLayoutText described by a layout name
+    such as 'maze-101x101-seed=3', or None if 'name' is not of that form.
+    """
+    match = SPEC_PATTERN.match(name)
+    if match is None:
+        return None
+    kind, width, height, parameters = match.groups()
+    spec = {'kind': kind, 'width': int(width), 'height': int(height)}
+    for parameter in parameters.split('-')[1:]:
+        key, value = parameter.split('=')
+        if key in INT_PARAMETERS:
+            spec[key] = int(value)
+        elif key in FLOAT_PARAMETERS:
+            spec[key] = float(value)
+        else:
+            return None
+    return spec
+
+
+def _carveMaze(grid, rng):
+    """
+    Carves a perfect maze with an iterative randomized depth-first search
+    over the cells of odd coordinates.
+    """
+    height, width = len(grid), len(grid[0])
+    start = (1 + 2 * rng.randrange((height - 1) // 2),
+             1 + 2 * rng.randrange((width - 1) // 2))
+    grid[start[0]][start[1]] = ' '
+    stack = [start]
+    while stack:
+        r, c = stack[-1]
+        neighbors = [(r + dr, c + dc)
+                     for dr, dc in ((-2, 0), (2, 0), (0, -2), (0, 2))
+                     if 0 < r + dr < height - 1 and 0 < c + dc < width - 1
+                     and grid[r + dr][c + dc] == '%']
+        if not neighbors:
+            stack.pop()
+            continue
+        nr, nc = rng.choice(neighbors)
+        grid[(r + nr) // 2][(c + nc) // 2] = ' '
+        grid[nr][nc] = ' '
+        stack.append((nr, nc))
+
+
+def _divideRooms(grid, rng, room):
+    """
+    Opens the inside of the layout, then recursively divides it into
+    rooms with walls of even coordinates, each having a door of odd
+    coordinate, so that later walls never block earlier doors.
+    """
+    height, width = len(grid), len(grid[0])
+    for r in range(1, height - 1):
+        for c in range(1, width - 1):
+            grid[r][c] = ' '
+
+    chambers = [(1, 1, height - 2, width - 2)]
+    while chambers:
+        top, left, bottom, right = chambers.pop()
+        rows = [r for r in range(top + room, bottom - room + 1) if r % 2 == 0]
+        cols = [c for c in range(left + room, right - room + 1) if c % 2 == 0]
+        horizontal = rows and (not cols or bottom - top >= right - left)
+        if horizontal:
+            r = rng.choice(rows)
+            door = rng.choice(range(left, right + 1, 2))
+            for c in range(left, right + 1):
+                if c != door:
+                    grid[r][c] = '%'
+            chambers.append((top, left, r - 1, right))
+            chambers.append((r + 1, left, bottom, right))
+        elif cols:
+            c = rng.choice(cols)
+            door = rng.choice(range(top, bottom + 1, 2))
+            for r in range(top, bottom + 1):
+                if r != door:
+                    grid[r][c] = '%'
+            chambers.append((top, left, bottom, c - 1))
+            chambers.append((top, c + 1, bottom, right))
+
+
+def _scatterWalls(grid, rng, walls):
+    height, width = len(grid), len(grid[0])
+    for r in range(1, height - 1):
+        for c in range(1, width - 1):
+            if rng.random() >= walls:
+                grid[r][c] = ' '
+
+
+def _addLoops(grid, rng, loops):
+    """
+    Removes, with probability 'loops', each inner wall cell lying between
+    two open cells in a straight line.
+    """
+    height, width = len(grid), len(grid[0])
+    for r in range(1, height - 1):
+        for c in range(1, width - 1):
+            if grid[r][c] != '%':
+                continue
+            vertical = grid[r - 1][c] == ' ' and grid[r + 1][c] == ' '
+            horizontal = grid[r][c - 1] == ' ' and grid[r][c + 1] == ' '
+            if vertical != horizontal and rng.random() < loops:
+                grid[r][c] = ' '
+
+
+def _connectedCells(grid):
+    """
+    Keeps the largest connected set of open cells, turning the others into
+    walls, and returns the list of its cells.
+    """
+    height, width = len(grid), len(grid[0])
+    seen = set()
+    largest = []
+    for r in range(1, height - 1):
+        for c in range(1, width - 1):
+            if grid[r][c] != ' ' or (r, c) in seen:
+                continue
+            component = [(r, c)]
+            seen.add((r, c))
+            fringe = deque(component)
+            while fringe:
+                cr, cc = fringe.popleft()
+                for n in ((cr - 1, cc), (cr + 1, cc),
+                          (cr, cc - 1), (cr, cc + 1)):
+                    if grid[n[0]][n[1]] == ' ' and n not in seen:
+                        seen.add(n)
+                        component.append(n)
+                        fringe.append(n)
+            if len(component) > len(largest):
+                for sr, sc in largest:
+                    grid[sr][sc] = '%'
+                largest = component
+            else:
+                for sr, sc in component:
+                    grid[sr][sc] = '%'
+    return largest
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Print the text of a generated layout, e.g. to save it '
+                    'in a .lay file.')
+    parser.add_argument('kind', choices=KINDS)
+    parser.add_argument('width', type=int)
+    parser.add_argument('height', type=int)
+    for parameter in INT_PARAMETERS:
+        parser.add_argument('--' + parameter, type=int)
+    for parameter in FLOAT_PARAMETERS:
+        parser.add_argument('--' + parameter, type=float)
+    args = vars(parser.parse_args())
+
+    print('\n'.join(generateLayoutText(
+        **{key: value for key, value in args.items() if value is not None})))
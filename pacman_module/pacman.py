@@ -41,24 +41,56 @@ The keys are 'a', 's', 'd', and 'w' to move (or arrow keys).  Have fun!
 """
 from .game import GameStateData
 from .game import Game
+from .game import Configuration
 from .game import Directions
 from .game import Actions
+from .game import AgentStateView
 from .util import nearestPoint
 from .util import manhattanDistance
 from . import textDisplay, graphicsDisplay
-from . import util, layout
+from . import util, layout, sampling
 import sys
 import types
 import time
 import random
 import os
 import numpy as np
-from copy import deepcopy
+from collections import deque
 
 ###################################################
 # YOUR INTERFACE TO THE PACMAN WORLD: A GameState #
 ###################################################
 
+class ExplorationTracer:
+    """
+    An ExplorationTracer records the cells occupied by Pacman in the states
+    generated by the agents, e.g. to visualize what a search explored.
+
+    At most 'capacity' cells are kept, the oldest being dropped first (no
+    limit if None). With 'sampleEvery' = k, only one state in k is recorded.
+    """
+
+    def __init__(self, capacity=100000, sampleEvery=1):
+        self.cells = deque(maxlen=capacity)
+        self.sampleEvery = sampleEvery
+        self.count = 0
+
+    def record(self, position):
+        self.count += 1
+        if self.count >= self.sampleEvery:
+            self.count = 0
+            self.cells.append(position)
+
+    def getAndReset(self):
+        """
+        Returns the set of recorded cells and clears the trace.
+        """
+        cells = set(self.cells)
+        self.cells.clear()
+        self.count = 0
+        return cells
+
+
 class GameState:
     """
     A GameState specifies the full game state, including the food, capsules,
@@ -78,8 +110,9 @@ class GameState:
     # Accessor methods: use these to access state data #
     ####################################################
 
-    # static variable keeps track of which states have had getLegalActions
-    explored = set()
+    # static variable holding the ExplorationTracer recording the explored
+    # states, if any
+    tracer = None
     # static variable keeps track of number of calls of
     # /!\ XXX: Do NOT modify this variable during get_action call.
     # /!\ Otherwise, your project won't be graded
@@ -91,17 +124,28 @@ class GameState:
     def setMaximumExpanded(m):
         GameState.maximumExpanded = m
 
+    def setExplorationTracer(tracer):
+        """
+        Sets the ExplorationTracer recording the explored states, or disables
+        tracing if 'tracer' is None (the default).
+        """
+        GameState.tracer = tracer
+    setExplorationTracer = staticmethod(setExplorationTracer)
+
     def getAndResetExplored():
-        tmp = GameState.explored.copy()
-        GameState.explored = set()
-        return tmp
+        """
+        Returns the set of Pacman cells recorded since the last call, which
+        is empty if tracing is disabled.
+        """
+        if GameState.tracer is None:
+            return set()
+        return GameState.tracer.getAndReset()
     getAndResetExplored = staticmethod(getAndResetExplored)
 
     def getLegalActions(self, agentIndex=0):
         """
         Returns the legal actions for the agent specified.
         """
-#        GameState.explored.add(self)
         if self.isWin() or self.isLose():
             return []
 
@@ -114,7 +158,6 @@ class GameState:
         """
         Returns True if 'action' is in the legal actions of the agent specified.
         """
-#        GameState.explored.add(self)
         if self.isWin() or self.isLose():
             return False
 
@@ -144,22 +187,27 @@ class GameState:
         elif state.data.agentStates[agentIndex].agtType > 0:                # A ghost is moving
             GhostRules.applyAction(state, action, agentIndex)
         else:
-            state.data.beliefStates = action                                    # Belief state replacement
+            state.data.beliefStates = GameStateData.freezeBeliefStates(action)  # Belief state replacement
 
         # Time passes
         if agentIndex == 0:
             state.data.scoreChange += -TIME_PENALTY  # Penalty for waiting around
-        else:
-            GhostRules.decrementTimer(state.data.agentStates[agentIndex])
+        elif state.data.agentStates[agentIndex].scaredTimer > 0:
+            state.data._hashAgent(agentIndex)
+            GhostRules.decrementTimer(
+                state.data.getMutableAgentState(agentIndex))
+            state.data._hashAgent(agentIndex)
 
         # Resolve multi-agent effects
         GhostRules.checkDeath(state, agentIndex)
 
         # Book keeping
         state.data._agentMoved = agentIndex
+        state.data._hashScore()
         state.data.score += state.data.scoreChange
-        GameState.explored.add(self)
-        GameState.explored.add(state)
+        state.data._hashScore()
+        if GameState.tracer is not None:
+            GameState.tracer.record(state.getPacmanPosition())
         return state
 
     def getLegalPacmanActions(self):
@@ -248,7 +296,7 @@ class GameState:
 
     def getCapsules(self):
         """
-        Returns a list of positions (x,y) of the remaining capsules.
+        Returns a tuple of positions (x,y) of the remaining capsules.
         """
         return self.data.capsules
 
@@ -279,6 +327,21 @@ class GameState:
         """
         return self.data.layout.walls
 
+    def getLayout(self):
+        """
+        Returns the layout of the game, which is shared by all its states and
+        must not be modified. See layout.Layout, e.g. for its distance table.
+        """
+        return self.data.layout
+
+    def getMazeDistance(self, pos1, pos2):
+        """
+        Returns the length of the shortest path between two open cells,
+        taking walls into account. Distances are precomputed once per layout,
+        unless it is too large, see Layout.getDistanceTable.
+        """
+        return self.data.layout.getMazeDistance(pos1, pos2)
+
     def hasFood(self, x, y):
         return self.data.food[x][y]
 
@@ -310,6 +373,24 @@ class GameState:
         state.data = self.data.deepCopy()
         return state
 
+    def makeObservation(self, agentIndex):
+        """
+        Returns the view of the state handed to agent 'agentIndex'.
+
+        The view shares the layout, food, capsules and agent states with
+        this state, so that it is built in time linear in the number of
+        agents only. Its agent states are read-only AgentStateViews, and
+        successors generated from it copy what they modify, so that agents
+        cannot alter the game through it.
+        """
+        state = GameState(self)
+        state.data = self.data.shallowCopy()
+        state.data.agentStates = [
+            agentState if isinstance(agentState, AgentStateView)
+            else AgentStateView(agentState)
+            for agentState in state.data.agentStates]
+        return state
+
     def __eq__(self, other):
         """
         Allows two states to be compared.
@@ -332,6 +413,253 @@ class GameState:
         """
         self.data.initialize(layout, numGhostAgents, isGhostVisible=not hiddenGhosts, beliefStateAgent=beliefStateAgent)
 
+
+class PacmanSearchProblem:
+    """
+    A lightweight view of the search problem faced by Pacman when it is
+    alone in the maze with food dots and capsules.
+
+    Search states are compact hashable tuples (position, food, capsules)
+    where position is the (x,y) cell of Pacman, and food and capsules are
+    bitmasks using the BitGrid cell indexing (bit x * height + y). Successors
+    are generated directly on these tuples: no GameState is ever built.
+
+    Ghosts are not modeled: their cells are merely treated as obstacles,
+    ignoring that a capsule lets Pacman eat them. Use forState to get a
+    GameStateSearchProblem instead whenever there are other agents.
+    Successor generation is accounted for in GameState.countExpanded,
+    exactly as with GameState.generatePacmanSuccessors.
+
+    With 'prunePockets', successors entering a dead-end pocket of the layout
+    without food left are not generated (see Layout.getPockets): they never
+    lie on a shortest route eating all the food.
+    """
+
+    def __init__(self, state, prunePockets=False):
+        self.layout = state.data.layout
+        self.pockets = self.layout.getPockets() if prunePockets else None
+        self.walls = state.getWalls()
+        self.width = self.walls.width
+        self.height = self.walls.height
+
+        capsules = 0
+        for x, y in state.getCapsules():
+            capsules |= 1 << (x * self.height + y)
+
+        self.ghostCells = set()
+        for agentState in state.data.agentStates[1:]:
+            if agentState.agtType > 0:
+                self.ghostCells.add(nearestPoint(agentState.getPosition()))
+
+        self.startState = (state.getPacmanPosition(), state.getFood().bits,
+                           capsules)
+        self._moves = {}
+        self._corridors = {}
+
+    def forState(state, prunePockets=False):
+        """
+        Returns the search problem of Pacman in 'state': a
+        PacmanSearchProblem if Pacman is alone, and a GameStateSearchProblem
+        otherwise.
+        """
+        if state.getNumAgents() > 1:
+            return GameStateSearchProblem(state)
+        return PacmanSearchProblem(state, prunePockets)
+    forState = staticmethod(forState)
+
+    def getStartState(self):
+        return self.startState
+
+    def isGoalState(self, state):
+        return state[1] == 0
+
+    def getMoves(self, position):
+        """
+        Returns the (action, next position) pairs Pacman can take from
+        'position', Directions.STOP excluded.
+        """
+        moves = self._moves.get(position)
+        if moves is None:
+            moves = self._moves[position] = tuple(
+                (action, next)
+                for action, next in self.layout.getLegalMoves(position)
+                if action != Directions.STOP and next not in self.ghostCells)
+        return moves
+
+    def getSuccessors(self, state):
+        """
+        Returns a list of (successor, action, stepCost) triples, where the
+        step cost is the number of points lost by taking the action: the
+        time penalty, plus 5 if a capsule is eaten.
+        """
+        if (GameState.countExpanded >= GameState.maximumExpanded):
+            raise Exception("Too many expanded nodes")
+        GameState.countExpanded += 1
+
+        position, food, capsules = state
+        if food == 0:
+            return []
+
+        height = self.height
+        tracer = GameState.tracer
+        pockets = self.pockets
+        successors = []
+        for action, next in self.getMoves(position):
+            if pockets is not None and \
+                    self.isEmptyPocket(position, next, food, pockets):
+                continue
+            if tracer is not None:
+                tracer.record(next)
+            bit = 1 << (next[0] * height + next[1])
+            if capsules & bit:
+                successor = (next, food & ~bit, capsules ^ bit)
+                successors.append((successor, action, TIME_PENALTY + 5))
+            else:
+                successor = (next, food & ~bit, capsules)
+                successors.append((successor, action, TIME_PENALTY))
+        return successors
+
+    def getCorridors(self, position):
+        """
+        Returns the corridors of the layout CorridorGraph leaving
+        'position', except those blocked by a ghost.
+        """
+        corridors = self._corridors.get(position)
+        if corridors is None:
+            corridors = self._corridors[position] = tuple(
+                corridor for corridor in
+                self.layout.getCorridorGraph().getCorridors(position)
+                if self.ghostCells.isdisjoint(corridor[1]))
+        return corridors
+
+    def getMacroSuccessors(self, state):
+        """
+        Returns a list of (successor, actions, stepCost) triples, where
+        Pacman follows a whole corridor to the next junction, dead end, food
+        or capsule cell, and actions is the tuple of the moves taken. The
+        step cost is the time penalty of every move, plus 5 if a capsule is
+        eaten. Since corridors hold no food, a shortest sequence of macro
+        actions eating all the food is also a shortest sequence of moves.
+        """
+        if (GameState.countExpanded >= GameState.maximumExpanded):
+            raise Exception("Too many expanded nodes")
+        GameState.countExpanded += 1
+
+        position, food, capsules = state
+        if food == 0:
+            return []
+
+        height = self.height
+        tracer = GameState.tracer
+        pockets = self.pockets
+        successors = []
+        for actions, cells in self.getCorridors(position):
+            if pockets is not None and \
+                    self.isEmptyPocket(position, cells[0], food, pockets):
+                continue
+            next = cells[-1]
+            if tracer is not None:
+                tracer.record(next)
+            bit = 1 << (next[0] * height + next[1])
+            cost = len(cells) * TIME_PENALTY
+            if capsules & bit:
+                successor = (next, food & ~bit, capsules ^ bit)
+                successors.append((successor, actions, cost + 5))
+            else:
+                successor = (next, food & ~bit, capsules)
+                successors.append((successor, actions, cost))
+        return successors
+
+    def isEmptyPocket(self, position, next, food, pockets):
+        """
+        Returns whether moving from 'position' to 'next' enters a dead-end
+        pocket holding none of the 'food'.
+        """
+        pocket = pockets.get(next)
+        return pocket is not None and pocket[0] == position \
+            and not food & pocket[1]
+
+
+class GameSearchState(tuple):
+    """
+    A search state of GameStateSearchProblem: the (position, food, capsules)
+    tuple of a PacmanSearchProblem state, holding the GameState it stands
+    for in 'gameState'. Two states are equal if their tuples are, and their
+    ghosts have the same positions and scared timers.
+    """
+
+    def __new__(cls, gameState, height):
+        capsules = 0
+        for x, y in gameState.getCapsules():
+            capsules |= 1 << (x * height + y)
+        state = tuple.__new__(cls, (gameState.getPacmanPosition(),
+                                    gameState.getFood().bits, capsules))
+        state.gameState = gameState
+        state.ghosts = tuple(
+            (agentState.getPosition(), agentState.scaredTimer)
+            for agentState in gameState.data.agentStates[1:])
+        return state
+
+    def __eq__(self, other):
+        return tuple.__eq__(self, other) and \
+            self.ghosts == getattr(other, 'ghosts', None)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((tuple.__hash__(self), self.ghosts))
+
+
+class GameStateSearchProblem:
+    """
+    The search problem of PacmanSearchProblem, with ghosts: successors are
+    generated with GameState.generatePacmanSuccessors, so that ghosts follow
+    the game rules. Ghosts do not move while Pacman searches, but a capsule
+    scares them and Pacman can then eat them, while stepping on a ghost
+    that is not scared loses the game.
+
+    Search states are GameSearchState tuples, so that agents written for
+    PacmanSearchProblem work unchanged, only slower.
+    """
+
+    def __init__(self, state):
+        self.layout = state.data.layout
+        self.height = self.layout.height
+        self.startState = GameSearchState(state, self.height)
+
+    def getStartState(self):
+        return self.startState
+
+    def isGoalState(self, state):
+        return state.gameState.isWin()
+
+    def getSuccessors(self, state):
+        """
+        Returns a list of (successor, action, stepCost) triples, with the
+        step costs of PacmanSearchProblem.getSuccessors. Losing successors
+        are not generated.
+        """
+        successors = []
+        for gameState, action in state.gameState.generatePacmanSuccessors():
+            if gameState.isLose():
+                continue
+            successor = GameSearchState(gameState, self.height)
+            # Capsules are only ever eaten
+            if successor[2] != state[2]:
+                successors.append((successor, action, TIME_PENALTY + 5))
+            else:
+                successors.append((successor, action, TIME_PENALTY))
+        return successors
+
+    def getMacroSuccessors(self, state):
+        """
+        Returns the successors of getSuccessors as macro actions of a
+        single move, see PacmanSearchProblem.getMacroSuccessors.
+        """
+        return [(successor, (action,), cost)
+                for successor, action, cost in self.getSuccessors(state)]
+
 ############################################################################
 #                     THE HIDDEN SECRETS OF PACMAN                         #
 #                                                                          #
@@ -427,9 +755,11 @@ class PacmanRules:
         """
         Returns a list of possible actions.
         """
-        return Actions.getPossibleActions(
-            state.getPacmanState().configuration,
-            state.data.layout.walls)
+        conf = state.getPacmanState().configuration
+        actions = state.data.layout.getLegalActions(conf.pos)
+        if actions is None:
+            return Actions.getPossibleActions(conf, state.data.layout.walls)
+        return list(actions)
     getLegalActions = staticmethod(getLegalActions)
 
     def applyAction(state, action):
@@ -440,12 +770,14 @@ class PacmanRules:
         if action not in legal:
             raise Exception("Illegal action " + str(action))
 
-        pacmanState = state.data.agentStates[0]
+        pacmanState = state.data.getMutableAgentState(0)
 
         # Update Configuration
         vector = Actions.directionToVector(action, PacmanRules.PACMAN_SPEED)
+        state.data._hashAgent(0)
         pacmanState.configuration = pacmanState.configuration.generateSuccessor(
             vector)
+        state.data._hashAgent(0)
 
         # Eat
         next = pacmanState.configuration.getPosition()
@@ -462,6 +794,7 @@ class PacmanRules:
             state.data.scoreChange += 10
             state.data.food = state.data.food.copy()
             state.data.food[x][y] = False
+            state.data._hashFood(position)
             state.data._foodEaten = position
             # TODO: cache numFood?
             numFood = state.getNumFood()
@@ -471,11 +804,16 @@ class PacmanRules:
         # Eat capsule
         if(position in state.getCapsules()):
             state.data.scoreChange -= 5
-            state.data.capsules.remove(position)
+            state.data.capsules = tuple(
+                capsule for capsule in state.data.capsules
+                if capsule != position)
+            state.data._hashCapsule(position)
             state.data._capsuleEaten = position
             # Reset all ghosts' scared timers
             for index in range(1, len(state.data.agentStates)):
-                state.data.agentStates[index].scaredTimer = SCARED_TIME
+                state.data._hashAgent(index)
+                state.data.getMutableAgentState(index).scaredTimer = SCARED_TIME
+                state.data._hashAgent(index)
     consume = staticmethod(consume)
 
 
@@ -491,15 +829,8 @@ class GhostRules:
         reach a dead end, but can turn 90 degrees at intersections.
         """
         conf = state.getGhostState(ghostIndex).configuration
-        possibleActions = Actions.getPossibleActions(
-            conf, state.data.layout.walls)
-        reverse = Actions.reverseDirection(conf.direction)
-        if Directions.STOP in possibleActions:
-            possibleActions.remove(Directions.STOP)
-        if "beliefStates" not in dir(state.data) and reverse in possibleActions and len(possibleActions) > 1:
-            possibleActions.remove(reverse)
-        
-        return possibleActions
+        return GhostRules.getLegalActionsAtPositionAndDirection(
+            state, ghostIndex, conf.pos, conf.direction)
     getLegalActions = staticmethod(getLegalActions)
 
     def getLegalActionsAtPositionAndDirection(state, ghostIndex, position, direction):
@@ -507,15 +838,16 @@ class GhostRules:
         Ghosts cannot stop, and cannot turn around unless they
         reach a dead end, but can turn 90 degrees at intersections.
         """
-        conf = deepcopy(state.getGhostState(ghostIndex).configuration)
-        conf.pos = position
-        conf.direction = direction
-        possibleActions = Actions.getPossibleActions(
-            conf, state.data.layout.walls)
-        reverse = Actions.reverseDirection(conf.direction)
+        actions = state.data.layout.getLegalActions(position)
+        if actions is None:
+            possibleActions = Actions.getPossibleActions(
+                Configuration(position, direction), state.data.layout.walls)
+        else:
+            possibleActions = list(actions)
+        reverse = Actions.reverseDirection(direction)
         if Directions.STOP in possibleActions:
             possibleActions.remove(Directions.STOP)
-        if "beliefStates" not in dir(state.data) and reverse in possibleActions and len(possibleActions) > 1:
+        if not hasattr(state.data, "beliefStates") and reverse in possibleActions and len(possibleActions) > 1:
             possibleActions.remove(reverse)
         
         return possibleActions
@@ -527,20 +859,26 @@ class GhostRules:
         if action not in legal:
             raise Exception("Illegal ghost action " + str(action))
 
-        ghostState = state.data.agentStates[ghostIndex]
+        ghostState = state.data.getMutableAgentState(ghostIndex)
         speed = GhostRules.GHOST_SPEED
         if ghostState.scaredTimer > 0:
             speed /= 2.0
         vector = Actions.directionToVector(action, speed)
+        state.data._hashAgent(ghostIndex)
         ghostState.configuration = ghostState.configuration.generateSuccessor(
             vector)
+        state.data._hashAgent(ghostIndex)
     applyAction = staticmethod(applyAction)
 
     def decrementTimer(ghostState):
         timer = ghostState.scaredTimer
         if timer == 1:
-            ghostState.configuration.pos = nearestPoint(
-                ghostState.configuration.pos)
+            # Configurations may be shared between states: replace, do not
+            # modify
+            configuration = ghostState.configuration
+            ghostState.configuration = Configuration(
+                nearestPoint(configuration.pos), configuration.direction,
+                configuration.visible)
         ghostState.scaredTimer = max(0, timer - 1)
     decrementTimer = staticmethod(decrementTimer)
 
@@ -563,9 +901,13 @@ class GhostRules:
     def collide(state, ghostState, agentIndex):
         if ghostState.scaredTimer > 0:
             state.data.scoreChange += 200
+            state.data._hashAgent(agentIndex)
+            ghostState = state.data.getMutableAgentState(agentIndex)
             GhostRules.placeGhost(state, ghostState)
             ghostState.scaredTimer = 0
+            state.data._hashAgent(agentIndex)
             # Added for first-person
+            state.data._eaten = state.data._eaten[:]
             state.data._eaten[agentIndex] = True
         else:
             if not state.data._win:
@@ -737,6 +1079,7 @@ def readCommand(argv):
     # Fix the random seed
     if options.fixRandomSeed:
         random.seed('cs188')
+        sampling.setSeed(188)
 
     # Choose a layout
     args['layout'] = layout.getLayout(options.layout)
@@ -786,7 +1129,7 @@ def readCommand(argv):
     if options.gameToReplay is not None:
         print('Replaying recorded game %s.' % options.gameToReplay)
         import pickle
-        f = open(options.gameToReplay)
+        f = open(options.gameToReplay, 'rb')
         try:
             recorded = pickle.load(f)
         finally:
@@ -834,7 +1177,7 @@ def replayGame(layout, actions, display):
     rules = ClassicGameRules()
     agents = [pacmanAgents.GreedyAgent()] + [ghostAgents.RandomGhost(i + 1)
                                              for i in range(layout.getNumGhosts())]
-    game = rules.newGame(layout, agents[0], agents[1:], display)
+    game = rules.newGame(layout, agents[0], agents[1:], None, display)
     state = game.state
     display.initialize(state.data)
 
@@ -879,6 +1222,7 @@ def runGames(
             layout,
             pacman,
             ghosts,
+            None,
             gameDisplay,
             beQuiet,
             catchExceptions)
@@ -891,10 +1235,9 @@ def runGames(
             import pickle
             fname = ('recorded-game-%d' % (i + 1)) + \
                 '-'.join([str(t) for t in time.localtime()[1:6]])
-            f = file(fname, 'w')
             components = {'layout': layout, 'actions': game.moveHistory}
-            pickle.dump(components, f)
-            f.close()
+            with open(fname, 'wb') as f:
+                pickle.dump(components, f)
 
     if (numGames - numTraining) > 0:
         scores = [game.state.getScore() for game in games]
@@ -916,7 +1259,8 @@ def runGame(
         ghosts,
         beliefstateagent,
         displayGraphics,
-        expout=np.inf,hiddenGhosts=False):
+        expout=np.inf,hiddenGhosts=False,
+        quiet=False):
     display = graphicsDisplay.PacmanGraphics(
         1.0, frameTime=0.1) if displayGraphics else textDisplay.NullGraphics()
     import __main__
@@ -924,5 +1268,5 @@ def runGame(
     lay = layout.getLayout(layout_name)
 
     rules = ClassicGameRules(expout)
-    game = rules.newGame(lay, pacman, ghosts, beliefstateagent, display, False, False, hiddenGhosts=hiddenGhosts)
+    game = rules.newGame(lay, pacman, ghosts, beliefstateagent, display, quiet, False, hiddenGhosts=hiddenGhosts)
     return game.run()
@@ -0,0 +1,154 @@
+# sampling.py
+# -----------
+# Sampling from discrete distributions with Walker alias tables, as used by
+# util.sample, util.nSample and util.chooseFromDistribution.
+
+
+"""
+An alias table draws a value of a discrete distribution of n values in
+O(1), from a single uniform number, after an O(n) construction. Tables are
+cached by distribution, so that agents sampling the same distribution over
+and over (e.g. stochastic ghosts in corridors) build it only once.
+
+Single draws consume exactly one random.random() number, like the former
+inverse transform sampling of util.sample, so that seeding the random
+module still reproduces games. Batch draws are vectorized with a
+numpy.random.Generator, seeded with setSeed.
+"""
+
+import random
+
+import numpy as np
+
+# Maximum number of cached alias tables
+CACHE_SIZE = 1024
+
+TABLE_CACHE = {}
+
+generator = np.random.default_rng()
+
+
+def setSeed(seed):
+    """
+    Seeds the generator of the batch draws.
+    """
+    global generator
+    generator = np.random.default_rng(seed)
+
+
+class AliasTable:
+    """
+    Walker alias table of the distribution giving weight 'weights[i]' to
+    'values[i]'. Weights need not be normalized.
+
+    Column i of the table holds value i with probability probabilities[i]
+    and value aliases[i] otherwise, all columns being equally likely.
+    """
+
+    def __init__(self, weights, values):
+        n = len(weights)
+        if n == 0 or n != len(values):
+            raise ValueError('Invalid distribution')
+        total = float(sum(weights))
+        if total <= 0:
+            raise ValueError('Distribution with a zero total weight')
+        self.values = list(values)
+
+        # Vose's construction: columns holding less than their share of
+        # probability are completed by the alias of a column holding more
+        scaled = [w * n / total for w in weights]
+        self.probabilities = [1.0] * n
+        self.aliases = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            donor = large[-1]
+            self.probabilities[s] = scaled[s]
+            self.aliases[s] = donor
+            scaled[donor] -= 1.0 - scaled[s]
+            if scaled[donor] < 1.0:
+                small.append(large.pop())
+        # Columns left are full, up to rounding errors
+        self._arrays = None
+
+    def draw(self):
+        """
+        Returns a value drawn with random.random().
+        """
+        u = random.random() * len(self.values)
+        i = int(u)
+        if u - i >= self.probabilities[i]:
+            i = self.aliases[i]
+        return self.values[i]
+
+    def drawIndices(self, n, rng=None):
+        """
+        Returns an array of the indices of 'n' values drawn with 'rng', a
+        numpy.random.Generator, or the generator of the module.
+        """
+        if rng is None:
+            rng = generator
+        if self._arrays is None:
+            self._arrays = (np.array(self.probabilities),
+                            np.array(self.aliases, dtype=np.intp))
+        probabilities, aliases = self._arrays
+        u = rng.random(n) * len(self.values)
+        columns = u.astype(np.intp)
+        return np.where(u - columns < probabilities[columns],
+                        columns, aliases[columns])
+
+    def drawMany(self, n, rng=None):
+        """
+        Returns a list of 'n' values drawn with 'rng', see drawIndices.
+        """
+        values = self.values
+        return [values[i] for i in self.drawIndices(n, rng)]
+
+
+def getAliasTable(distribution, values=None):
+    """
+    Returns the alias table of a distribution, given either as a dict (or
+    a util.DenseCounter) from values to weights or as a list of weights and
+    the list of their 'values'. Tables of distributions of hashable values
+    are cached, the oldest ones being evicted first.
+    """
+    if hasattr(distribution, 'aliasKey'):
+        key = distribution.aliasKey()
+    elif hasattr(distribution, 'items'):
+        key = tuple(distribution.items())
+    else:
+        key = (tuple(values), tuple(distribution))
+
+    try:
+        table = TABLE_CACHE.get(key)
+    except TypeError:
+        # Unhashable values
+        table = key = None
+
+    if table is None:
+        if hasattr(distribution, 'items'):
+            items = distribution.items()
+            values = [value for value, _ in items]
+            distribution = [weight for _, weight in items]
+        table = AliasTable(distribution, values)
+        if key is not None:
+            TABLE_CACHE[key] = table
+            if len(TABLE_CACHE) > CACHE_SIZE:
+                del TABLE_CACHE[next(iter(TABLE_CACHE))]
+    return table
+
+
+def sample(distribution, values=None):
+    """
+    Returns a value drawn from a distribution, see getAliasTable.
+    """
+    return getAliasTable(distribution, values).draw()
+
+
+def nSample(distribution, values, n, rng=None):
+    """
+    Returns a list of 'n' values drawn from a distribution, see
+    getAliasTable and AliasTable.drawIndices.
+    """
+    return getAliasTable(distribution, values).drawMany(n, rng)
@@ -29,8 +29,14 @@
 import sys
 import inspect
 import heapq
+import math
 import random
 import io
+from collections import deque
+
+import numpy as np
+
+from . import sampling
 
 
 class FixedRandom:
@@ -154,21 +160,31 @@ class Stack:
 
 
 class Queue:
-    "A container with a first-in-first-out (FIFO) queuing policy."
+    """
+    A container with a first-in-first-out (FIFO) queuing policy, backed by a
+    deque so that both ends are accessed in O(1).
+    """
 
     def __init__(self):
-        self.list = []
+        self.list = deque()
+
+    def __len__(self):
+        return len(self.list)
 
     def push(self, item):
         "Enqueue the 'item' into the queue"
-        self.list.insert(0, item)
+        self.list.append(item)
+
+    def extend(self, items):
+        "Enqueue all the 'items' into the queue, in order"
+        self.list.extend(items)
 
     def pop(self):
         """
           Dequeue the earliest enqueued item still in the queue. This
           operation removes the item from the queue.
         """
-        return self.list.pop()
+        return self.list.popleft()
 
     def isEmpty(self):
         "Returns true if the queue is empty"
@@ -233,6 +249,194 @@ class PriorityQueueWithFunction(PriorityQueue):
         PriorityQueue.push(self, item, self.priorityFunction(item))
 
 
+class IndexedPriorityQueue(PriorityQueue):
+    """
+      Implements a priority queue holding at most one entry per key. A
+      position index maps each key to its entry in the binary heap, which
+      gives O(1) membership tests and O(log n) decrease-key through update.
+
+      Keys are the items themselves, unless a key function is provided
+      (e.g. to index search nodes by their state). Pushing an item whose
+      key is already in the queue behaves like update.
+
+      In lazy mode, update and remove do not restructure the heap: outdated
+      entries are only marked as removed and skipped when they are popped.
+    """
+
+    _REMOVED = object()
+
+    def __init__(self, key=None, lazy=False):
+        PriorityQueue.__init__(self)
+        self.key = key
+        self.lazy = lazy
+        # key -> entry [priority, count, item, key] (and heap slot, if eager)
+        self.entries = {}
+        self.position = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, item):
+        return self._key(item) in self.entries
+
+    def _key(self, item):
+        return item if self.key is None else self.key(item)
+
+    def push(self, item, priority):
+        self.update(item, priority)
+
+    def pop(self):
+        if self.lazy:
+            while True:
+                priority, _, item, key = heapq.heappop(self.heap)
+                if item is not IndexedPriorityQueue._REMOVED:
+                    del self.entries[key]
+                    return (priority, item)
+
+        priority, _, item, key = self._removeAt(0)
+        return (priority, item)
+
+    def isEmpty(self):
+        return len(self.entries) == 0
+
+    def getPriority(self, item):
+        "Returns the priority of 'item' in the queue, or None if absent"
+        entry = self.entries.get(self._key(item))
+        return None if entry is None else entry[0]
+
+    def update(self, item, priority):
+        # If item already in priority queue with higher priority, decrease
+        # its priority. If item already in priority queue with equal or
+        # lower priority, do nothing. Otherwise, insert it.
+        key = self._key(item)
+        entry = self.entries.get(key)
+
+        if entry is None:
+            entry = [priority, self.count, item, key]
+            self.count += 1
+            self.entries[key] = entry
+            if self.lazy:
+                heapq.heappush(self.heap, entry)
+            else:
+                self.heap.append(entry)
+                self.position[key] = len(self.heap) - 1
+                self._siftUp(len(self.heap) - 1)
+        elif priority < entry[0]:
+            if self.lazy:
+                entry[2] = IndexedPriorityQueue._REMOVED
+                entry = [priority, entry[1], item, key]
+                self.entries[key] = entry
+                heapq.heappush(self.heap, entry)
+            else:
+                entry[0] = priority
+                entry[2] = item
+                self._siftUp(self.position[key])
+
+    def remove(self, item):
+        "Removes the entry of 'item' from the queue, if any"
+        key = self._key(item)
+        if key not in self.entries:
+            return
+        if self.lazy:
+            self.entries.pop(key)[2] = IndexedPriorityQueue._REMOVED
+        else:
+            self._removeAt(self.position[key])
+
+    def _removeAt(self, pos):
+        heap = self.heap
+        entry = heap[pos]
+        last = heap.pop()
+        del self.entries[entry[3]]
+        del self.position[entry[3]]
+        if pos < len(heap):
+            heap[pos] = last
+            self.position[last[3]] = pos
+            self._siftUp(pos)
+            self._siftDown(self.position[last[3]])
+        return entry
+
+    def _siftUp(self, pos):
+        heap, position = self.heap, self.position
+        entry = heap[pos]
+        while pos > 0:
+            parentPos = (pos - 1) >> 1
+            parent = heap[parentPos]
+            if entry < parent:
+                heap[pos] = parent
+                position[parent[3]] = pos
+                pos = parentPos
+            else:
+                break
+        heap[pos] = entry
+        position[entry[3]] = pos
+
+    def _siftDown(self, pos):
+        heap, position = self.heap, self.position
+        size = len(heap)
+        entry = heap[pos]
+        while True:
+            childPos = 2 * pos + 1
+            if childPos >= size:
+                break
+            if childPos + 1 < size and heap[childPos + 1] < heap[childPos]:
+                childPos += 1
+            child = heap[childPos]
+            if child < entry:
+                heap[pos] = child
+                position[child[3]] = pos
+                pos = childPos
+            else:
+                break
+        heap[pos] = entry
+        position[entry[3]] = pos
+
+
+class IndexedPriorityQueueWithFunction(IndexedPriorityQueue):
+    """
+    Implements an indexed priority queue with the same push/pop signature of
+    the Queue and the Stack classes, see PriorityQueueWithFunction.
+    """
+
+    def __init__(self, priorityFunction, key=None, lazy=False):
+        "priorityFunction (item) -> priority"
+        self.priorityFunction = priorityFunction
+        IndexedPriorityQueue.__init__(self, key, lazy)
+
+    def push(self, item):
+        "Adds an item to the queue with priority from the priority function"
+        IndexedPriorityQueue.push(self, item, self.priorityFunction(item))
+
+
+class SearchNode:
+    """
+    A node of a search tree. Instead of carrying the whole list of actions
+    leading to it, a node only links to its parent and to the action that
+    generated it; the action sequence is rebuilt once, at the goal, with
+    getActions().
+    """
+    __slots__ = ('state', 'parent', 'action', 'cost', 'depth')
+
+    def __init__(self, state, parent=None, action=None, cost=0):
+        self.state = state
+        self.parent = parent
+        self.action = action
+        self.cost = cost
+        self.depth = 0 if parent is None else parent.depth + 1
+
+    def child(self, state, action, stepCost=1):
+        "Returns the node reached from this one by taking 'action'"
+        return SearchNode(state, self, action, self.cost + stepCost)
+
+    def getActions(self):
+        "Returns the list of actions leading from the root to this node"
+        actions = [None] * self.depth
+        node = self
+        while node.parent is not None:
+            actions[node.depth - 1] = node.action
+            node = node.parent
+        return actions
+
+
 def manhattanDistance(xy1, xy2):
     "Returns the Manhattan distance between points xy1 and xy2"
     return abs(xy1[0] - xy2[0]) + abs(xy1[1] - xy2[1])
@@ -463,6 +667,193 @@ class Counter(dict):
         return addend
 
 
+class DenseCounter:
+    """
+    A counter over a fixed set of keys, with the API of Counter, storing
+    its counts in a NumPy array instead of a dictionary.
+
+    Counts are read and written without any dictionary allocation, and
+    normalize, totalCount, argMax and the dot product run on the array.
+    Like Counter, keys default to 0 and only the keys that were set are
+    listed by keys(), values() and items(), in the order of the fixed keys.
+    Setting a key outside the fixed set raises a KeyError.
+
+    >>> a = DenseCounter(['first', 'second', 'third'])
+    >>> a['first'] = 1
+    >>> a['third'] += 3
+    >>> a.normalize()
+    >>> a.items()
+    [('first', 0.25), ('third', 0.75)]
+    >>> a['second']
+    0.0
+    """
+
+    def __init__(self, keys, index=None):
+        self.fixedKeys = tuple(keys)
+        if index is None:
+            index = {key: i for i, key in enumerate(self.fixedKeys)}
+        self.index = index
+        self.counts = np.zeros(len(self.fixedKeys))
+        # Bit i is set if key i was set
+        self.present = 0
+
+    def __getitem__(self, key):
+        i = self.index.get(key)
+        if i is None:
+            return 0
+        return self.counts.item(i)
+
+    def __setitem__(self, key, value):
+        i = self.index[key]
+        self.counts[i] = value
+        self.present |= 1 << i
+
+    def __contains__(self, key):
+        i = self.index.get(key)
+        return i is not None and bool(self.present >> i & 1)
+
+    def __len__(self):
+        return bin(self.present).count('1')
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, dict(self.items()))
+
+    def keys(self):
+        present = self.present
+        return [key for i, key in enumerate(self.fixedKeys)
+                if present >> i & 1]
+
+    def values(self):
+        present = self.present
+        return [count for i, count in enumerate(self.counts.tolist())
+                if present >> i & 1]
+
+    def items(self):
+        present = self.present
+        counts = self.counts.tolist()
+        return [(key, counts[i]) for i, key in enumerate(self.fixedKeys)
+                if present >> i & 1]
+
+    def aliasKey(self):
+        """
+        Returns a hashable key identifying the distribution, for the cache
+        of alias tables of the sampling module.
+        """
+        return (self.fixedKeys, self.present, self.counts.tobytes())
+
+    def incrementAll(self, keys, count):
+        """
+        Increments all elements of keys by the same count.
+        """
+        for key in keys:
+            self[key] += count
+
+    def argMax(self):
+        """
+        Returns the key with the highest value.
+        """
+        if not self.present:
+            return None
+        counts = self.counts.copy()
+        for i in range(len(counts)):
+            if not self.present >> i & 1:
+                counts[i] = -np.inf
+        return self.fixedKeys[int(np.argmax(counts))]
+
+    def sortedKeys(self):
+        """
+        Returns a list of keys sorted by their values.  Keys
+        with the highest values will appear first.
+        """
+        return [key for key, _ in
+                sorted(self.items(), key=lambda item: -item[1])]
+
+    def totalCount(self):
+        """
+        Returns the sum of counts for all keys.
+        """
+        # Faster than NumPy reductions on the small arrays of counters
+        return math.fsum(self.counts.tolist())
+
+    def normalize(self):
+        """
+        Edits the counter such that the total count of all
+        keys sums to 1.  The ratio of counts for all keys
+        will remain the same.
+        """
+        total = self.totalCount()
+        if total == 0:
+            return
+        np.divide(self.counts, total, out=self.counts)
+
+    def divideAll(self, divisor):
+        """
+        Divides all counts by divisor
+        """
+        self.counts /= float(divisor)
+
+    def copy(self):
+        """
+        Returns a copy of the counter
+        """
+        counter = type(self).__new__(type(self))
+        counter.fixedKeys = self.fixedKeys
+        counter.index = self.index
+        counter.counts = self.counts.copy()
+        counter.present = self.present
+        return counter
+
+    def _sameKeys(self, y):
+        return isinstance(y, DenseCounter) and y.fixedKeys == self.fixedKeys
+
+    def __mul__(self, y):
+        """
+        Multiplying two counters gives the dot product of their vectors where
+        each unique label is a vector element.
+        """
+        if self._sameKeys(y):
+            return float(np.dot(self.counts, y.counts))
+        return sum(count * y[key] for key, count in self.items()
+                   if key in y)
+
+    def __radd__(self, y):
+        """
+        Adding another counter to a counter increments the current counter
+        by the values stored in the second counter.
+        """
+        for key, value in list(y.items()):
+            self[key] += value
+
+    def __add__(self, y):
+        """
+        Adding two counters gives a counter with the union of all keys and
+        counts of the second added to counts of the first. Both counters
+        must have the same fixed keys.
+        """
+        if not self._sameKeys(y):
+            raise KeyError('Counters with different keys')
+        addend = self.copy()
+        addend.counts += y.counts
+        addend.present |= y.present
+        return addend
+
+    def __sub__(self, y):
+        """
+        Subtracting a counter from another gives a counter with the union of
+        all keys and counts of the second subtracted from counts of the
+        first. Both counters must have the same fixed keys.
+        """
+        if not self._sameKeys(y):
+            raise KeyError('Counters with different keys')
+        addend = self.copy()
+        addend.counts -= y.counts
+        addend.present |= y.present
+        return addend
+
+
 def raiseNotDefined():
     fileName = inspect.stack()[1][1]
     line = inspect.stack()[1][2]
@@ -497,39 +888,15 @@ def normalize(vectorOrCounter):
 
 
 def nSample(distribution, values, n):
-    if sum(distribution) != 1:
-        distribution = normalize(distribution)
-    rand = sorted([random.random() for i in range(n)])
-    samples = []
-    samplePos, distPos, cdf = 0, 0, distribution[0]
-    while samplePos < n:
-        if rand[samplePos] < cdf:
-            samplePos += 1
-            samples.append(values[distPos])
-        else:
-            distPos += 1
-            cdf += distribution[distPos]
-    return samples
+    return sampling.nSample(distribution, values, n)
 
 
 def sample(distribution, values=None):
-    if isinstance(distribution, Counter):
-        items = sorted(distribution.items())
-        distribution = [i[1] for i in items]
-        values = [i[0] for i in items]
-    if sum(distribution) != 1:
-        distribution = normalize(distribution)
-    choice = random.random()
-    i, total = 0, distribution[0]
-    while choice > total:
-        i += 1
-        total += distribution[i]
-    return values[i]
+    return sampling.sample(distribution, values)
 
 
 def sampleFromCounter(ctr):
-    items = sorted(ctr.items())
-    return sample([v for k, v in items], [k for k, v in items])
+    return sampling.sample(ctr)
 
 
 def getProbability(value, distribution, values):
@@ -551,14 +918,10 @@ def flipCoin(p):
 
 def chooseFromDistribution(distribution):
     "Takes either a counter or a list of (prob, key) pairs and samples"
-    if isinstance(distribution, dict) or isinstance(distribution, Counter):
-        return sample(distribution)
-    r = random.random()
-    base = 0.0
-    for prob, element in distribution:
-        base += prob
-        if r <= base:
-            return element
+    if isinstance(distribution, (dict, Counter, DenseCounter)):
+        return sampling.sample(distribution)
+    return sampling.sample([prob for prob, _ in distribution],
+                           [element for _, element in distribution])
 
 
 def nearestPoint(pos):
@@ -1,5 +1,5 @@
 from pacman_module.game import Agent, Directions
-from pacman_module.util import PriorityQueue, manhattanDistance
+from pacman_module.util import IndexedPriorityQueue, SearchNode, manhattanDistance
 
 
 def key(state):
@@ -95,9 +95,8 @@ class PacmanAgent(Agent):
         - A list of legal moves as defined in `game.Directions`.
         """
 
-        path = []
-        fringe = PriorityQueue()
-        fringe.push((state, path, 0.), 0.)
+        fringe = IndexedPriorityQueue(key=lambda node: key(node.state))
+        fringe.push(SearchNode(state, cost=0.), 0.)
 
         closed = set()
 
@@ -105,17 +104,18 @@ class PacmanAgent(Agent):
             if fringe.isEmpty():
                 return []
 
-            _, (current, path, cost) = fringe.pop()
+            _, node = fringe.pop()
+            current = node.state
 
             current_key = key(current)
 
             if current.isWin():
-                return path
+                return node.getActions()
 
-            if current_key not in closed:
-                closed.add(current_key)
+            closed.add(current_key)
 
-                for next_state, action in current.generatePacmanSuccessors():
-                    next_cost = cost + step_cost(current, next_state)
-                    fringe.push((next_state, path + [action], next_cost), next_cost +
-                                heuristic(next_state))
+            for next_state, action in current.generatePacmanSuccessors():
+                if key(next_state) not in closed:
+                    child = node.child(next_state, action,
+                                       step_cost(current, next_state))
+                    fringe.update(child, child.cost + heuristic(next_state))